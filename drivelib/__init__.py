@@ -3,6 +3,11 @@ __version__ = get_versions()['version']
 del get_versions
 
 from .drive import *
+from .transfer import *
+from .bandwidth import *
+from .journal import *
+from .cache import *
+from .changes import *
 
 from . import _version
 __version__ = _version.get_versions()['version']
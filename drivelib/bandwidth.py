@@ -0,0 +1,97 @@
+import threading
+import time
+
+__all__ = ['TokenBucket', 'BandwidthLimiter', 'bandwidth_limiter']
+
+
+class TokenBucket:
+    """Token bucket refilled with `rate` tokens (bytes) per second, holding
+    at most `burst` tokens. With rate=None nothing is limited."""
+    def __init__(self, rate=None, burst=None):
+        self._condition = threading.Condition()
+        self.rate = None
+        self.burst = None
+        self._tokens = 0
+        self._last = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate=None, burst=None):
+        """Change rate and burst at runtime. Transfers that are currently
+        waiting are rescheduled for the new rate. burst defaults to one
+        second worth of tokens."""
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive or None")
+        with self._condition:
+            self._refill()
+            was_limited = self.rate is not None
+            self.rate = rate
+            self.burst = burst if burst is not None else rate
+            self._default_burst = burst is None
+            if rate is None:
+                self._tokens = 0
+            elif not was_limited:
+                self._tokens = self.burst
+            else:
+                self._tokens = min(self._tokens, self.burst)
+            self._condition.notify_all()
+
+    def consume(self, amount):
+        """Take `amount` tokens, blocking until the bucket can afford them.
+        Amounts larger than burst are admitted by going into debt, which
+        the caller and everyone after it have to wait for."""
+        with self._condition:
+            if self.rate is None:
+                return
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return
+            rate = self.rate
+            deadline = time.monotonic() - self._tokens / rate
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._condition.wait(remaining)
+                if self.rate is None:
+                    return
+                if self.rate != rate:
+                    remaining = deadline - time.monotonic()
+                    deadline = time.monotonic() + remaining * rate / self.rate
+                    rate = self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+# Default of BandwidthLimiter.configure() for budgets to leave as they are
+_unchanged = object()
+
+
+class BandwidthLimiter:
+    """Separate upload and download budgets in bytes per second, shared by
+    every transfer that draws from them."""
+    def __init__(self, upload=None, download=None, upload_burst=None, download_burst=None):
+        self.upload = TokenBucket(upload, upload_burst)
+        self.download = TokenBucket(download, download_burst)
+
+    def configure(self, upload=_unchanged, download=_unchanged, upload_burst=_unchanged, download_burst=_unchanged):
+        """Change the budgets at runtime. Only a direction whose rate or
+        burst is passed is changed, None means unlimited."""
+        for bucket, rate, burst in ((self.upload, upload, upload_burst),
+                                    (self.download, download, download_burst)):
+            if rate is _unchanged and burst is _unchanged:
+                continue
+            if burst is _unchanged:
+                # A burst that was given explicitly stays, a default one
+                # follows the rate
+                burst = None if bucket._default_burst else bucket.burst
+            bucket.configure(bucket.rate if rate is _unchanged else rate, burst)
+
+
+# Process-wide limiter used by DriveFile.download() and
+# ResumableUploadRequest.next_chunk(). Unlimited until configured.
+bandwidth_limiter = BandwidthLimiter()
@@ -0,0 +1,269 @@
+import sys
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections import namedtuple
+from collections.abc import MutableMapping
+from datetime import timedelta
+
+__all__ = ['PersistentCache', 'LRUCache', 'CacheStats']
+
+CacheStats = namedtuple('CacheStats', 'hits misses evictions expirations entries bytes')
+
+
+def _sizeof(obj) -> int:
+    """Estimated memory use of a cache entry: the object, its attributes
+    or elements, but not what those refer to"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        return size + sum(_sizeof(element) for element in obj)
+    attributes = getattr(obj, '__dict__', None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+        size += sum(sys.getsizeof(value) for value in attributes.values())
+    return size
+
+
+class LRUCache(MutableMapping):
+    """Thread-safe in-memory cache that drops the least recently used
+    entries beyond max_len entries or max_bytes estimated bytes. Entries
+    older than max_age are dropped when they are next accessed. sizeof
+    estimates the size of a value in bytes.
+
+    Lookups with [] and get() count as hits or misses; `in` and items()
+    don't count and don't change the order."""
+    def __init__(self, max_len=1000, max_age: timedelta = None, max_bytes=None, sizeof=_sizeof):
+        self.max_len = max_len
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.RLock()
+        # key -> (value, expires, size), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, self.expirations,
+                                len(self._entries), self._bytes)
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value, expires, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        expires = time.monotonic() + self.max_age.total_seconds() if self.max_age is not None else float('inf')
+        size = sys.getsizeof(key) + self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires, size)
+            self._bytes += size
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __iter__(self):
+        return iter([key for key, _ in self.items()])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key in self._entries:
+                value = self._entries[key][0]
+                self._remove(key)
+                return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def items(self) -> list:
+        """Unexpired entries as a list, so the cache may be changed while
+        going through them"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (value, expires, _) in self._entries.items() if expires > now]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            key, (_, expires, _) = next(iter(self._entries.items()))
+            if expires <= now:
+                self.expirations += 1
+            elif (self.max_len is not None and len(self._entries) > self.max_len) \
+                    or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self.evictions += 1
+            else:
+                break
+            self._remove(key)
+
+
+class PersistentCache:
+    """SQLite store for the id and name caches of GoogleDrive, so a new
+    process doesn't have to resolve every path again. Items are stored as
+    the API reply they were created from, names as (parent id, name) -> id.
+    Entries older than max_age are ignored; beyond max_len entries the
+    oldest are dropped. Several processes can use the same file at once.
+    Put whole listings with put_items() and put_names(), each costs a
+    single transaction."""
+    def __init__(self, path, max_age=timedelta(hours=1), max_len=100000):
+        self.path = path
+        self.max_age = max_age
+        self.max_len = max_len
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            # Readers don't block the writer of another process
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # A cache may lose its last writes on power loss, but not get corrupted
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            with self._db:
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS items (
+                        id TEXT PRIMARY KEY,
+                        reply TEXT NOT NULL,
+                        stored REAL NOT NULL
+                    )""")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS names (
+                        parent_id TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        id TEXT NOT NULL,
+                        stored REAL NOT NULL,
+                        PRIMARY KEY (parent_id, name)
+                    )""")
+                self._db.execute("CREATE INDEX IF NOT EXISTS names_by_id ON names (id)")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    )""")
+
+    def get_item(self, id_) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT reply FROM items WHERE id = ? AND stored > ?",
+                                    (id_, self._oldest())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_item(self, reply: dict, id_=None):
+        """Store reply under its id, or under id_ if it was requested by
+        an alias like 'root'."""
+        self._write("INSERT OR REPLACE INTO items (id, reply, stored) VALUES (?, ?, ?)",
+                        [(id_ or reply['id'], json.dumps(reply), time.time())])
+
+    def put_items(self, replies: list):
+        stored = time.time()
+        self._write("INSERT OR REPLACE INTO items (id, reply, stored) VALUES (?, ?, ?)",
+                        [(reply['id'], json.dumps(reply), stored) for reply in replies])
+
+    def delete_item(self, id_):
+        self._write("DELETE FROM items WHERE id = ?", [(id_,)])
+
+    def get_name(self, parent_id, name, max_age: timedelta = None) -> str:
+        """max_age ignores names stored earlier than that, if it's shorter
+        than the max_age of the cache"""
+        with self._lock:
+            row = self._db.execute("SELECT id FROM names WHERE parent_id = ? AND name = ? AND stored > ?",
+                                    (parent_id, name, self._oldest(max_age))).fetchone()
+        return row[0] if row else None
+
+    def put_name(self, parent_id, name, id_):
+        self.put_names(parent_id, {name: id_})
+
+    def put_names(self, parent_id, names: dict):
+        """Store the name -> id pairs of names below parent_id"""
+        stored = time.time()
+        self._write("INSERT OR REPLACE INTO names (parent_id, name, id, stored) VALUES (?, ?, ?, ?)",
+                        [(parent_id, name, id_, stored) for name, id_ in names.items()])
+
+    def delete_name(self, parent_id, name):
+        self.delete_names(parent_id, [name])
+
+    def delete_names(self, parent_id, names: list):
+        self._write("DELETE FROM names WHERE parent_id = ? AND name = ?",
+                        [(parent_id, name) for name in names])
+
+    def delete_names_of(self, id_):
+        """Delete every name that points to id_"""
+        self._write("DELETE FROM names WHERE id = ?", [(id_,)])
+
+    def get_meta(self, key) -> str:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_meta(self, key, value: str):
+        self._write("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(key, value)])
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM items")
+            self._db.execute("DELETE FROM names")
+            self._db.execute("DELETE FROM meta")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _oldest(self, max_age: timedelta = None) -> float:
+        if max_age is None or max_age > self.max_age:
+            max_age = self.max_age
+        return time.time() - max_age.total_seconds()
+
+    def _write(self, statement, rows: list):
+        """Run statement for each of rows in one transaction"""
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany(statement, rows)
+            writes = self._writes + len(rows)
+            if writes // 100 > self._writes // 100:
+                self._prune()
+            self._writes = writes
+
+    def _prune(self):
+        oldest = self._oldest()
+        for table in ('items', 'names'):
+            self._db.execute("DELETE FROM {} WHERE stored <= ?".format(table), (oldest,))
+            self._db.execute("""DELETE FROM {table} WHERE rowid IN (
+                                    SELECT rowid FROM {table} ORDER BY stored DESC, rowid DESC LIMIT -1 OFFSET ?
+                                )""".format(table=table), (self.max_len,))
@@ -0,0 +1,48 @@
+import threading
+import logging
+
+__all__ = ['ChangeFollower']
+
+logger = logging.getLogger('drivelib')
+
+
+class ChangeFollower:
+    """Background thread that calls GoogleDrive.apply_changes() every
+    `interval` seconds, so the caches of a long running process notice
+    renames, moves and deletions. Errors are logged and retried on the
+    next round."""
+    def __init__(self, drive, interval=30):
+        self.drive = drive
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Record the starting point before anything is cached
+        self.drive.apply_changes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                changes = self.drive.apply_changes()
+            except Exception:
+                logger.exception("Could not fetch changes")
+                continue
+            if changes:
+                logger.debug("Applied %d changes", changes)
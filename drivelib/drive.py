@@ -1,14 +1,24 @@
 from __future__ import annotations #only > 3.7, better to find a different solution
 
 import os
+import io
+import mmap
 from abc import ABC, abstractmethod
 import json
 import itertools
+import copy
+import collections
+from collections.abc import MutableMapping
 from functools import wraps
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import hashlib
 from urllib.parse import urlparse
 from urllib.parse import parse_qs
+from urllib.parse import quote
 
 from pathlib import PurePosixPath
 
@@ -25,14 +35,18 @@ import google.oauth2.credentials
 import oauth2client.client
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaUpload
+from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.http import MediaUploadProgress
 from googleapiclient.http import MediaDownloadProgress
 
-from expiringdict import ExpiringDict
 from datetime import datetime, timedelta
 
 from drivelib.errors import GoogleDriveAPIError
 from drivelib.errors import BackendError
+from drivelib.bandwidth import bandwidth_limiter
+from drivelib.cache import PersistentCache
+from drivelib.cache import LRUCache
 
 import logging
 logger = logging.getLogger('drivelib')
@@ -101,9 +115,11 @@ class Credentials(google.oauth2.credentials.Credentials,
         return json.dumps(to_serialize)
 
 class ResumableMediaUploadProgress(MediaUploadProgress):
-    def __init__(self, resumable_progress, total_size, resumable_uri):
+    def __init__(self, resumable_progress, total_size, resumable_uri, chunksize=None, resumable_state=None):
         super().__init__(resumable_progress, total_size)
         self.resumable_uri = resumable_uri
+        self.chunksize = chunksize
+        self.resumable_state = resumable_state
 
     def __str__(self):
         return "{}/{} ({:.0%}%) {}".format(
@@ -113,6 +129,164 @@ class ResumableMediaUploadProgress(MediaUploadProgress):
                                 self.resumable_uri
                             )
 
+class ResumableMediaDownloadProgress(MediaDownloadProgress):
+    def __init__(self, resumable_progress, total_size, chunksize=None):
+        super().__init__(resumable_progress, total_size)
+        self.chunksize = chunksize
+
+    def __str__(self):
+        return "{}/{} ({:.0%}%)".format(
+                                self.resumable_progress,
+                                self.total_size,
+                                self.progress()
+                            )
+
+class AdaptiveChunksize:
+    """Chunk size that follows the measured throughput. Pass an instance
+    as chunksize to DriveFile.download() or DriveFile.upload(). Every
+    request is sized to take about target_duration seconds and a failed
+    request halves the size. Instances can be shared between transfers."""
+    def __init__(self, initial=defaultChunksize, minimum=minimalChunksize,
+                    maximum=minimalChunksize*256, target_duration=2.0):
+        if not 0 < minimum <= maximum:
+            raise ValueError("Need 0 < minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_duration = target_duration
+        self._lock = threading.Lock()
+        self._chunksize = self._clamp(initial)
+
+    @classmethod
+    def fixed(cls, chunksize) -> AdaptiveChunksize:
+        return cls(chunksize, chunksize, chunksize)
+
+    @property
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def aligned(self, multiple) -> int:
+        """The current chunk size rounded down to a multiple of `multiple`"""
+        return max(multiple, self._chunksize - self._chunksize % multiple)
+
+    def update(self, transferred, duration):
+        if transferred <= 0 or duration <= 0:
+            return
+        with self._lock:
+            desired = transferred / duration * self.target_duration
+            # Change by at most a factor of two to smooth out outliers
+            desired = min(max(desired, self._chunksize/2), self._chunksize*2)
+            self._chunksize = self._clamp(desired)
+
+    def failed(self):
+        with self._lock:
+            self._chunksize = self._clamp(self._chunksize/2)
+
+    def _clamp(self, chunksize) -> int:
+        return int(max(self.minimum, min(self.maximum, chunksize)))
+
+def _chunksizer(chunksize) -> AdaptiveChunksize:
+    if isinstance(chunksize, AdaptiveChunksize):
+        return chunksize
+    return AdaptiveChunksize.fixed(chunksize or defaultChunksize)
+
+def _run_in_threads(tasks, func, callback, threads):
+    """Call func(*task) for every task of the thread-safe iterator `tasks`
+    on `threads` worker threads. callback is called with each result on
+    the calling thread, so it may raise to stop all workers."""
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        try:
+            for task in tasks:
+                if stop.is_set():
+                    break
+                results.put((func(*task), None))
+        except Exception as err:
+            results.put((None, err))
+        finally:
+            results.put(None)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(worker)
+        running = threads
+        try:
+            while running:
+                item = results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                result, err = item
+                if err:
+                    raise err
+                callback(*result)
+        finally:
+            stop.set()
+
+def _run_pipelined(tasks, produce, consume, callback, depth):
+    """Call produce(*task) for every task on the calling thread and pass
+    its result on to consume() on a worker thread through a queue holding
+    up to `depth` items, so both overlap. callback is called with every
+    result of consume() on the calling thread."""
+    pending = queue.Queue(maxsize=depth)
+    results = queue.Queue()
+
+    def worker():
+        failed = False
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if failed:
+                continue
+            try:
+                results.put((consume(*item), None))
+            except Exception as err:
+                failed = True
+                results.put((None, err))
+
+    def drain():
+        while True:
+            try:
+                result, err = results.get_nowait()
+            except queue.Empty:
+                return
+            if err:
+                raise err
+            callback(*result)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        for task in tasks:
+            pending.put(produce(*task))
+            drain()
+        pending.put(None)
+        thread.join()
+        drain()
+    finally:
+        if thread.is_alive():
+            pending.put(None)
+            thread.join()
+
+def _split_fields(fields: str) -> list:
+    """Split a field mask like 'id, shortcutDetails(targetId, targetMimeType)'
+    into its top-level fields"""
+    split = []
+    depth = 0
+    start = 0
+    for pos, char in enumerate(fields):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            split.append(fields[start:pos].strip())
+            start = pos + 1
+    split.append(fields[start:].strip())
+    return [field for field in split if field]
+
 def needs_id(f):
     @wraps(f)
     def wrapper(self, *args, **kwargs):
@@ -130,6 +304,295 @@ def autorefresh(f):
         return f(self, *args, **kwargs)
     return wrapper
 
+class _DownloadManifest:
+    """Append-only sidecar next to a partial download. The first line
+    identifies the remote file, every further line records a byte range
+    that has been written to disk along with its MD5 digest."""
+    suffix = '.drivelib'
+    verify_tail = 4
+
+    def __init__(self, local_file, remote_file: DriveFile):
+        self.path = local_file + self.suffix
+        self.header = {'id': remote_file.id, 'size': remote_file.size, 'md5': remote_file.md5sum}
+        self.size = remote_file.size
+        self.ranges = dict()
+        self.contiguous = 0
+        self._fh = None
+
+    @classmethod
+    def load(cls, local_file, remote_file: DriveFile) -> _DownloadManifest:
+        manifest = cls(local_file, remote_file)
+        try:
+            with open(manifest.path) as fh:
+                if json.loads(fh.readline()) != manifest.header:
+                    return manifest
+                for line in fh:
+                    if not line.endswith('\n'):
+                        break # torn write
+                    offset, length, digest = line.split()
+                    manifest._record(int(offset), int(length), None if digest == '-' else digest)
+        except (FileNotFoundError, ValueError):
+            pass
+        return manifest
+
+    def _record(self, offset, length, digest):
+        self.ranges[offset] = (length, digest)
+        while self.contiguous in self.ranges and self.ranges[self.contiguous][0] > 0:
+            self.contiguous += self.ranges[self.contiguous][0]
+
+    def clear(self):
+        self.ranges = dict()
+        self.contiguous = 0
+
+    def verify(self, fh, local_file_size):
+        """Forget ranges that are not on disk and re-hash only the most
+        recently recorded ones, which are the ones a crash could have hit."""
+        ranges = self.ranges
+        self.clear()
+        recent = list(ranges)[-self.verify_tail:]
+        for offset, (length, digest) in ranges.items():
+            if offset + length > local_file_size:
+                continue
+            if offset in recent and digest:
+                fh.seek(offset)
+                if hashlib.md5(fh.read(length)).hexdigest() != digest:
+                    continue
+            self._record(offset, length, digest)
+
+    def missing(self):
+        """Yield (offset, length) of all gaps that are not yet on disk"""
+        offset = 0
+        for start, (length, _) in sorted(self.ranges.items()) + [(self.size, (0, None))]:
+            if offset < start:
+                yield offset, start-offset
+            offset = max(offset, start+length)
+
+    def open(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            fh.write(json.dumps(self.header)+'\n')
+            for offset, (length, digest) in self.ranges.items():
+                fh.write("{} {} {}\n".format(offset, length, digest or '-'))
+        os.replace(tmp_path, self.path)
+        self._fh = open(self.path, 'a')
+
+    def add(self, offset, length, digest=None):
+        self._record(offset, length, digest)
+        self._fh.write("{} {} {}\n".format(offset, length, digest or '-'))
+        self._fh.flush()
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class _RangeScheduler:
+    """Thread-safe iterator handing out the given gaps piece by piece, each
+    piece as large as the chunk size at the time it is requested."""
+    def __init__(self, gaps, chunksize: AdaptiveChunksize):
+        self._gaps = iter(gaps)
+        self._chunksize = chunksize
+        self._offset = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            if self._offset >= self._end:
+                self._offset, length = next(self._gaps)
+                self._end = self._offset + length
+            offset = self._offset
+            length = min(self._chunksize.chunksize, self._end-offset)
+            self._offset += length
+            return offset, length
+
+class _FileHasher(threading.Thread):
+    """Computes the MD5 of a file on a background thread while it is still
+    being written. The writer announces with advance() up to which offset
+    the file is complete."""
+    def __init__(self, path, chunksize=defaultChunksize):
+        super().__init__(daemon=True)
+        self.path = path
+        self.chunksize = chunksize
+        self._md5 = hashlib.md5()
+        self._position = 0
+        self._available = 0
+        self._closed = False
+        self._cancelled = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._marks = []
+        self.digests = dict()
+        self.start()
+
+    def mark(self, offset):
+        """Have the digest of the first `offset` bytes stored in digests.
+        Offsets need to be marked before the hasher is advanced to them."""
+        with self._condition:
+            self._marks.append(offset)
+            self._marks.sort()
+
+    def advance(self, position):
+        with self._condition:
+            if position > self._available:
+                self._available = position
+                self._condition.notify()
+
+    def cancel(self):
+        self._cancelled = True
+        self._close()
+
+    def hexdigest(self) -> str:
+        self._close()
+        if self._error:
+            raise self._error
+        return self._md5.hexdigest()
+
+    def _close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.join()
+
+    def run(self):
+        try:
+            # Unbuffered, a read-ahead could see data before it is written
+            with open(self.path, 'rb', buffering=0) as fh:
+                while not self._cancelled:
+                    with self._condition:
+                        while self._position >= self._available and not self._closed:
+                            self._condition.wait()
+                        available = self._available
+                    if self._position >= available:
+                        return
+                    while self._position < available and not self._cancelled:
+                        with self._condition:
+                            while self._marks and self._marks[0] <= self._position:
+                                self._marks.pop(0)
+                            until = min(self._marks[0], available) if self._marks else available
+                        chunk = fh.read(min(self.chunksize, until-self._position))
+                        if not chunk:
+                            raise EOFError("{} is shorter than expected".format(self.path))
+                        self._md5.update(chunk)
+                        self._position += len(chunk)
+                        with self._condition:
+                            if self._position in self._marks:
+                                self.digests[self._position] = self._md5.hexdigest()
+        except Exception as err:
+            self._error = err
+
+class _ContentHasher:
+    """Computes the MD5 of a file from the content written to it, so it
+    needn't be read back. The first `position` bytes, written before, are
+    read from the file. If content is not written in order, the whole
+    file is read back by hexdigest()."""
+    def __init__(self, path, position=0, chunksize=defaultChunksize):
+        self.path = path
+        self.chunksize = chunksize
+        self._md5 = self._hash_file(position)
+        self._position = position
+        self._in_order = True
+
+    def update(self, offset, content):
+        if offset != self._position:
+            self._in_order = False
+        if self._in_order:
+            self._md5.update(content)
+            self._position += len(content)
+
+    def advance(self, position):
+        pass
+
+    def cancel(self):
+        pass
+
+    def hexdigest(self) -> str:
+        if not self._in_order:
+            return self._hash_file().hexdigest()
+        return self._md5.hexdigest()
+
+    def _hash_file(self, length=None):
+        md5 = hashlib.md5()
+        with open(self.path, 'rb') as fh:
+            while length is None or length > 0:
+                chunk = fh.read(self.chunksize if length is None else min(self.chunksize, length))
+                if not chunk:
+                    if length:
+                        raise EOFError("{} is shorter than expected".format(self.path))
+                    break
+                md5.update(chunk)
+                if length is not None:
+                    length -= len(chunk)
+        return md5
+
+class _DriveFileIO(io.RawIOBase):
+    """Seekable read-only raw stream of a DriveFile's content. Every read
+    is served by a single HTTP Range request."""
+    def __init__(self, drive_file: DriveFile):
+        super().__init__()
+        self._file = drive_file
+        self._size = drive_file.size
+        self._position = 0
+
+    @property
+    def name(self):
+        return self._file.name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError("invalid whence ({}, should be 0, 1 or 2)".format(whence))
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        length = min(len(b), self._size - self._position)
+        if length <= 0:
+            return 0
+        content = self._file._download_range(self._position, length)
+        memoryview(b).cast('B')[:len(content)] = content
+        self._position += len(content)
+        return len(content)
+
+    def readall(self) -> bytes:
+        # RawIOBase.readall() would issue a request for every 8 KiB
+        content = bytearray()
+        while True:
+            chunk = self.read(defaultChunksize)
+            if not chunk:
+                return bytes(content)
+            content += chunk
+
 class _DriveParents(Sequence):
     """This object provides sequence-like access to the logical ancestors
     of a path."""
@@ -176,6 +639,7 @@ class DriveItem(ABC):
         self.spaces = spaces
         self.last_refreshed = datetime.now()
         self.refresh_after = refresh_after
+        self._metadata = dict()
 
     def __eq__(self, other):
         return self.id == other.id
@@ -237,18 +701,22 @@ class DriveItem(ABC):
                                     addParents=new_dest.id,
                                     removeParents=self.parent.id,
                                     fields='name, parents',
-                                    ).execute()
+                                    ).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
+        self.drive._uncache(self)
         self.name = result['name']
         self.parent_ids = result.get('parents', [])
+        self._metadata.clear()
+        self.drive._forget_misses(self.parent_ids, self.name)
         
     @needs_id
     def remove(self):
         try:
-            self.drive.service.files().delete(fileId=self.id).execute()
+            self.drive.service.files().delete(fileId=self.id).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
+        self.drive._uncache(self)
         self.id = None
 
     def trash(self):
@@ -264,18 +732,37 @@ class DriveItem(ABC):
                                     fileId=self.id,
                                     body=metadata,
                                     fields=','.join(metadata.keys()),
-                                    ).execute()
+                                    ).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
-        #TODO update local array
+        # Other fields like modifiedTime may change along
+        self._metadata.clear()
+        self._metadata.update(result)
+        if 'name' in metadata or 'trashed' in metadata:
+            self.drive._uncache(self)
+            self.drive._forget_misses(self.parent_ids, metadata.get('name', self.name))
 
     @needs_id
     def meta_get(self, fields: str) -> dict:
-        #TODO cache metadata
-        try:
-            return self.drive.service.files().get(fileId=self.id, fields=fields).execute()
-        except HttpError as err:
-            raise GoogleDriveAPIError.from_http_error(err)
+        """Fields already known are answered from memory, only the others
+        are requested. Fields with a sub-selection like
+        shortcutDetails(targetId) are always requested."""
+        requested = _split_fields(fields)
+        simple = [field for field in requested if field.isidentifier()]
+        missing = [field for field in requested if field not in self._metadata]
+        if missing:
+            try:
+                result = self.drive.service.files().get(fileId=self.id, fields=', '.join(missing)).execute(http=self.drive.http)
+            except HttpError as err:
+                raise GoogleDriveAPIError.from_http_error(err)
+            for field in missing:
+                if field.isidentifier():
+                    # The API leaves out fields without a value
+                    self._metadata[field] = result.get(field)
+        else:
+            result = dict()
+        result.update((field, self._metadata[field]) for field in simple if self._metadata[field] is not None)
+        return copy.deepcopy(result)
 
     @needs_id
     def refresh(self):
@@ -283,12 +770,19 @@ class DriveItem(ABC):
             result = self.drive.service.files().get(
                                     fileId=self.id,
                                     fields=self.drive.default_fields
-                                ).execute()
+                                ).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
         self.name = result['name']
         self.parent_ids = result['parents']
         self.last_refreshed = datetime.now()
+        self._metadata.clear()
+
+    @property
+    def modified_time(self) -> datetime:
+        if 'modifiedTime' not in self._metadata:
+            self._metadata.update(self.meta_get('modifiedTime'))
+        return datetime.strptime(self._metadata['modifiedTime'], '%Y-%m-%dT%H:%M:%S.%f%z')
 
     @needs_id
     def create_shortcut(self, name, parent=None) -> DriveShortcut:
@@ -311,21 +805,36 @@ class DriveItem(ABC):
         try:
             result = self.drive.service.files().create(
                                             body=shortcut_metadata,
-                                            fields=self.drive.default_fields).execute()
+                                            fields=self.drive.default_fields).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
         return self._reply_to_object(result)
 
-    def _reply_to_object(self, reply) -> DriveItem:
+    def _reply_to_object(self, reply, persist=True) -> DriveItem:
+        new_item = self._build_object(reply)
+        self.drive._cache_item(new_item, reply if persist else None)
+        return new_item
+
+    def _build_object(self, reply) -> DriveItem:
+        """DriveItem for reply, without adding it to any cache"""
+        spaces = ",".join(reply.get('spaces', ['drive']))
         if reply['mimeType'] == 'application/vnd.google-apps.folder':
-            new_item = DriveFolder(self.drive, reply.get('parents', []), reply['name'], reply['id'], spaces=",".join(reply['spaces']))
+            new_item = DriveFolder(self.drive, reply.get('parents', []), reply['name'], reply['id'], spaces=spaces)
         elif reply['mimeType'] == 'application/vnd.google-apps.shortcut':
-            new_item = DriveShortcut(self.drive, reply.get('parents', []), reply['name'], reply['id'], reply['shortcutDetails']['targetId'], spaces=",".join(reply['spaces']))
+            target_id = reply.get('shortcutDetails', {}).get('targetId')
+            new_item = DriveShortcut(self.drive, reply.get('parents', []), reply['name'], reply['id'], target_id, spaces=spaces)
         else:
-            new_item = DriveFile(self.drive, reply.get('parents', []), reply['name'], reply['id'], spaces=",".join(reply['spaces']))
-        self.drive._id_cache[new_item.id] = new_item
+            new_item = DriveFile(self.drive, reply.get('parents', []), reply['name'], reply['id'], spaces=spaces)
+        new_item._hydrate(reply)
         return new_item
 
+    def _hydrate(self, reply: dict):
+        """Keep metadata the API sent along so it needn't be fetched again"""
+        structural = [field.strip() for field in self.drive.default_fields.split(',')]
+        for field, value in reply.items():
+            if field not in structural:
+                self._metadata[field] = value
+
 
     @abstractmethod
     def isfolder(self) -> bool:
@@ -343,14 +852,22 @@ class DriveFolder(DriveItem):
     def isshortcut(self) -> bool:
         return False
     
-    def child(self, name) -> DriveItem:
+    def child(self, name, profile='minimal') -> DriveItem:
         child = self._get_from_name_cache(name)
+        if isinstance(child, tuple):
+            logger.debug("Found {} in name cache as ambiguous".format(name))
+            raise AmbiguousPathError("Two or more files {name}".format(name=name), duplicates=iter(child))
         if child:
             logger.debug("Found {} in name cache".format(name))
             return child
-        gen = self.children(name=name, pageSize=2)
+        miss_key = '/'.join((self.id, name))
+        if self.drive._miss_cache.get(miss_key):
+            logger.debug("Found {} in miss cache".format(name))
+            raise FileNotFoundError(name)
+        gen = self.children(name=name, pageSize=2, profile=profile)
         child = next(gen, None)
         if child is None:
+            self.drive._miss_cache[miss_key] = True
             raise FileNotFoundError(name)
         next_child = next(gen, None)
         if next_child is not None:
@@ -361,17 +878,36 @@ class DriveFolder(DriveItem):
 
     @needs_id
     def _add_to_name_cache(self, item: DriveItem):
-        self.drive._name_cache['/'.join((self.id, item.name))] = item
+        self.drive._cache_name('/'.join((self.id, item.name)), item)
+        if self.drive.cache:
+            self.drive.cache.put_name(self.id, item.name, item.id)
 
     @needs_id
     def _delete_from_name_cache(self, item: DriveItem):
-        del self.drive._name_cache['/'.join((self.id, item.name))]
+        self.drive._name_cache.pop('/'.join((self.id, item.name)), None)
+        if self.drive.cache:
+            self.drive.cache.delete_name(self.id, item.name)
 
     def _get_from_name_cache(self, name: str):
-        return self.drive._name_cache.get('/'.join(((self.id, name))), None)
+        item = self.drive._name_cache.get('/'.join(((self.id, name))), None)
+        if item is None and self.drive.cache:
+            id_ = self.drive.cache.get_name(self.id, name, max_age=self.drive._name_cache_ttl)
+            if id_ is None:
+                return None
+            try:
+                item = self.drive.item_by_id(id_)
+            except FileNotFoundError:
+                item = None
+            if item is None or item.name != name or self.id not in item.parent_ids:
+                # Outdated, the item was renamed, moved or deleted
+                self.drive.cache.delete_name(self.id, name)
+                return None
+            self.drive._cache_name('/'.join((self.id, name)), item)
+        return item
 
     @needs_id
-    def children(self, name=None, folders=True, files=True, trashed=False, pageSize=100, orderBy=None, skip=0) -> Iterator(DriveItem):
+    def children(self, name=None, folders=True, files=True, trashed=False, pageSize=100, orderBy=None, skip=0, metadata=False, profile=None) -> Iterator(DriveItem):
+        """profile names the fields to request, see GoogleDrive.field_profiles"""
         query = "'{this}' in parents".format(this=self.id)
 
         if name:
@@ -389,7 +925,28 @@ class DriveFolder(DriveItem):
         else:
             query += " and trashed = false"
 
-        return self.drive.items_by_query(query, pageSize=pageSize, orderBy=orderBy, spaces=self.spaces, skip=skip)
+        items = self.drive.items_by_query(query, pageSize=pageSize, orderBy=orderBy, spaces=self.spaces, skip=skip, metadata=metadata, profile=profile)
+        if name or not folders or not files or trashed or skip:
+            return items
+        return self._warm_name_cache(items)
+
+    def _warm_name_cache(self, items: Iterator(DriveItem)) -> Iterator(DriveItem):
+        """Pass items through. Once the listing is complete, add the names
+        it contained to the name cache, duplicates as ambiguous."""
+        by_name = dict()
+        for item in items:
+            by_name.setdefault(item.name, []).append(item)
+            yield item
+        unique = dict()
+        for name, found in by_name.items():
+            if len(found) == 1:
+                self.drive._cache_name('/'.join((self.id, name)), found[0])
+                unique[name] = found[0].id
+            else:
+                self.drive._cache_name('/'.join((self.id, name)), tuple(found))
+        if self.drive.cache:
+            self.drive.cache.put_names(self.id, unique)
+            self.drive.cache.delete_names(self.id, [name for name in by_name if name not in unique])
 
     @needs_id
     def mkdir(self, name, ignore_existing=False) -> DriveFolder:
@@ -413,7 +970,7 @@ class DriveFolder(DriveItem):
             'parents': [self.id]
         }
         try:
-            result = self.drive.service.files().create(body=file_metadata, fields=self.drive.default_fields).execute()
+            result = self.drive.service.files().create(body=file_metadata, fields=self.drive.default_fields).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
         return self._reply_to_object(result)
@@ -465,12 +1022,18 @@ class DriveFolder(DriveItem):
         else:
             return child.create_path(splitpath[1])
 
+    @needs_id
     def isempty(self) -> bool:
-        gen = self.children(pageSize=1)
-        if next(gen, None) is None:
-            return True
-        else:
-            return False
+        try:
+            result = self.drive.service.files().list(
+                    pageSize=1,
+                    spaces=self.spaces,
+                    fields="files(id)",
+                    q="'{this}' in parents and trashed = false".format(this=self.id),
+                ).execute(http=self.drive.http)
+        except HttpError as err:
+            raise GoogleDriveAPIError.from_http_error(err)
+        return not result.get('files')
         
 class DriveFile(DriveItem):  
 
@@ -483,84 +1046,356 @@ class DriveFile(DriveItem):
     def __init__(self, drive, parent_ids, filename, file_id=None, spaces='drive', resumable_uri=None):
         super().__init__(drive, parent_ids, filename, file_id, spaces)
         self.resumable_uri = resumable_uri
+        self.resumable_state = None
         
     @needs_id
-    def download(self, local_file, chunksize=None, progress_handler=None):
-        if not chunksize:
-            chunksize = defaultChunksize
+    def download(self, local_file, chunksize=None, progress_handler=None, parallel=1, pipeline=0):
+        """Download to local_file, resuming a previous partial download.
+        With parallel > 1, that many ranges are fetched at once. Otherwise
+        pipeline > 0 lets up to that many fetched chunks wait to be written
+        and hashed on a worker thread while the next one is fetched."""
+        chunksize = _chunksizer(chunksize)
         #TODO: Accept Path objects for local_file
 
-        range_md5 = hashlib.md5()
+        size = self.size
+        manifest = _DownloadManifest.load(local_file, self)
         try:
             local_file_size = os.path.getsize(local_file)
-            with open(local_file, "rb") as f:
-                for chunk in iter(lambda: f.read(chunksize), b""):
-                    range_md5.update(chunk)
         except FileNotFoundError:
             local_file_size = 0
-        
+            manifest.clear()
+        if not manifest.ranges and 0 < local_file_size <= size:
+            # Continue a partial file that has no manifest
+            manifest._record(0, local_file_size, None)
+
+        with open(local_file, 'r+b' if local_file_size else 'wb') as fh:
+            manifest.verify(fh, local_file_size)
+            # Parallel downloads write out of order, so preallocate the file
+            fh.truncate(size if parallel > 1 else min(local_file_size, size))
+            manifest.open()
+            if parallel > 1:
+                # Written out of order, so read back as it becomes contiguous
+                hasher = _FileHasher(local_file)
+                hasher.advance(manifest.contiguous)
+            else:
+                hasher = _ContentHasher(local_file, manifest.contiguous)
+
+            downloaded = sum(length for length, _ in manifest.ranges.values())
+            write_lock = threading.Lock()
+
+            def fetch(offset, length):
+                return offset, self._download_range(offset, length, chunksize)
+
+            def store(offset, content):
+                digest = hashlib.md5(content).hexdigest()
+                with write_lock:
+                    fh.seek(offset)
+                    fh.write(content)
+                    fh.flush()
+                    if parallel <= 1:
+                        hasher.update(offset, content)
+                return offset, len(content), digest
+
+            def completed(offset, length, digest):
+                nonlocal downloaded
+                manifest.add(offset, length, digest)
+                hasher.advance(manifest.contiguous)
+                downloaded += length
+                if progress_handler:
+                    progress_handler(ResumableMediaDownloadProgress(downloaded, size, chunksize.chunksize))
 
-        download_url = "https://www.googleapis.com/drive/v3/files/{fileid}?alt=media".\
-                                format(fileid=self.id)
-        
-        with open(local_file, 'ab') as fh:
-            while local_file_size < self.size:
-                download_range = "bytes={}-{}".\
-                    format(local_file_size, local_file_size+chunksize-1)
-                    
-                # replace with googleapiclient.http.HttpRequest if possible
-                # or patch MediaIoBaseDownload to support Range
-                resp, content = self.drive.service._http.request(
-                                            download_url,
-                                            headers={'Range': download_range})
-                if resp.status == 206:
-                        fh.write(content)
-                        local_file_size+=int(resp['content-length'])
-                        range_md5.update(content)
-                        if progress_handler:
-                            progress_handler(MediaDownloadProgress(local_file_size, self.size))
-                else:
-                    raise GoogleDriveAPIError.from_reply(resp, content)
-        if range_md5.hexdigest() != self.md5sum:
+            try:
+                while downloaded < size:
+                    downloaded_before = downloaded
+                    pending = _RangeScheduler(list(manifest.missing()), chunksize)
+                    if parallel > 1:
+                        _run_in_threads(pending, lambda *task: store(*fetch(*task)), completed, parallel)
+                    elif pipeline > 0:
+                        _run_pipelined(pending, fetch, store, completed, pipeline)
+                    else:
+                        for offset, length in pending:
+                            completed(*store(*fetch(offset, length)))
+                    if downloaded == downloaded_before:
+                        break
+            except BaseException:
+                hasher.cancel()
+                manifest.close()
+                raise
+
+        local_md5 = hasher.hexdigest()
+        manifest.remove()
+        if local_md5 != self.md5sum:
             os.remove(local_file)
             raise CheckSumError("Checksum mismatch. Need to repeat download.")
 
+    @needs_id
+    def download_into(self, target, chunksize=None, progress_handler=None) -> int:
+        """Download the whole file straight into `target` instead of a local
+        path. `target` is either a writable buffer at least `size` bytes
+        long (bytearray, memoryview, mmap, ...), a file descriptor or a
+        binary file object. Returns the number of bytes written."""
+        chunksize = _chunksizer(chunksize)
+        size = self.size
+
+        try:
+            view = memoryview(target).cast('B')
+        except TypeError:
+            view = None
+        if view is not None:
+            if view.readonly:
+                raise TypeError("Cannot download into a read-only buffer")
+            if len(view) < size:
+                raise ValueError("Buffer too small ({} < {} bytes)".format(len(view), size))
+            def write(offset, content):
+                view[offset:offset+len(content)] = content
+        elif isinstance(target, int):
+            def write(offset, content):
+                remaining = memoryview(content)
+                while remaining:
+                    remaining = remaining[os.write(target, remaining):]
+        else:
+            def write(offset, content):
+                target.write(content)
+
+        range_md5 = hashlib.md5()
+        offset = 0
+        while offset < size:
+            content = self._download_range(offset, min(chunksize.chunksize, size-offset), chunksize)
+            if not content:
+                break
+            write(offset, content)
+            range_md5.update(content)
+            offset += len(content)
+            if progress_handler:
+                progress_handler(ResumableMediaDownloadProgress(offset, size, chunksize.chunksize))
+        if range_md5.hexdigest() != self.md5sum:
+            raise CheckSumError("Checksum mismatch. Need to repeat download.")
+        return offset
+
+    @needs_id
+    def readinto(self, buffer, offset=0) -> int:
+        """Read up to len(buffer) bytes starting at `offset` of the remote
+        file into the writable buffer. Returns the number of bytes read."""
+        with self.open(buffering=0) as fh:
+            fh.seek(offset)
+            return fh.readinto(buffer)
+
+    @needs_id
+    def open(self, mode='rb', buffering=defaultChunksize):
+        """Open the remote file as a seekable binary stream. Small reads
+        fetch `buffering` bytes ahead, which also bounds the memory held by
+        the buffer. With buffering=0 every read is a request of its own."""
+        if mode != 'rb':
+            raise ValueError("invalid mode: {}, only 'rb' is supported".format(mode))
+        raw = _DriveFileIO(self)
+        if buffering == 0:
+            return raw
+        return io.BufferedReader(raw, buffer_size=buffering)
+
+    def _download_range(self, start, length, chunksize=None) -> bytes:
+        download_url = "https://www.googleapis.com/drive/v3/files/{fileid}?alt=media".\
+                                format(fileid=self.id)
+        download_range = "bytes={}-{}".format(start, start+length-1)
+        bandwidth_limiter.download.consume(length)
+
+        # replace with googleapiclient.http.HttpRequest if possible
+        # or patch MediaIoBaseDownload to support Range
+        started = time.monotonic()
+        try:
+            resp, content = self.drive.http.request(
+                                        download_url,
+                                        headers={'Range': download_range})
+        except Exception:
+            if chunksize:
+                chunksize.failed()
+            raise
+        if resp.status != 206:
+            if chunksize:
+                chunksize.failed()
+            raise GoogleDriveAPIError.from_reply(resp, content)
+        if chunksize:
+            chunksize.update(len(content), time.monotonic()-started)
+        return content
+
     def upload(self, local_file, chunksize=None,
-                resumable_uri=None, progress_handler=None):
-        if not chunksize:
-            chunksize = defaultChunksize
+                resumable_uri=None, progress_handler=None, resumable_state=None,
+                multipart_threshold=None, use_mmap=False, keep_revision=False, prefetch=0):
+        """Upload local_file. If the file already exists on the drive, the
+        upload becomes its new revision, keeping id and sharing; with
+        keep_revision the current revision is marked to be kept forever
+        before it is replaced, instead of being purged eventually. Files up
+        to multipart_threshold bytes, by default the chunksize, are sent in
+        a single request. Larger files, and uploads that are resumed, use a
+        resumable upload session. With use_mmap the file is memory mapped
+        instead of read chunk by chunk, which saves copying when many large
+        files are uploaded at once. It must not be truncated during the
+        upload then. With prefetch, up to that many bytes (but at least two
+        chunks) are buffered while reading ahead on a background thread, so
+        slow disks don't keep the connection idle. Chunks then don't grow
+        beyond half of that."""
+        if use_mmap and prefetch:
+            raise ValueError("use_mmap and prefetch can't be combined")
+        chunksize, adaptive_chunksize = self._upload_chunksize(chunksize)
+        if multipart_threshold is None:
+            multipart_threshold = chunksize
         #TODO: Accept Path objects for local_file
-        if self.id:
-            raise FileExistsError("Uploading new revision not yet implemented")
-        if os.path.getsize(local_file) == 0:
+        local_file_size = os.path.getsize(local_file)
+        if local_file_size == 0 and not self.id:
             self.upload_empty()
             return
+        if keep_revision and self.id:
+            self._keep_head_revision()
+        if local_file_size <= multipart_threshold and not (resumable_uri or resumable_state or self.resumable_uri):
+            media = MediaFileUpload(local_file, resumable=False)
+            local_md5 = hashlib.md5(media.getbytes(0, local_file_size)).hexdigest()
+            self._upload_multipart(media, local_md5, progress_handler)
+            return
 
-        media = MediaFileUpload(local_file, resumable=True, chunksize=chunksize)
-        file_metadata = {
-            'name': self.name, 
-            'parents': self.parent_ids
-        }
-                
-        request = ResumableUploadRequest(self.drive.service, media_body=media, body=file_metadata)
+        if use_mmap:
+            media = _MmapMedia(local_file, chunksize)
+        elif prefetch:
+            media = _PrefetchMedia(local_file, chunksize, prefetch)
+        else:
+            media = MediaFileUpload(local_file, resumable=True, chunksize=chunksize)
+        local_stat = os.stat(local_file)
+        request = ResumableUploadRequest(self.drive.service, media_body=media, body=self._upload_metadata(),
+                                            chunksize=adaptive_chunksize, http=self.drive.http,
+                                            fingerprint=[local_stat.st_size, local_stat.st_mtime_ns],
+                                            fields=', '.join((self.drive.default_fields, self.drive.metadata_fields)),
+                                            file_id=self.id)
+        if resumable_state:
+            self.resumable_state = resumable_state
+            self.resumable_uri = resumable_state['resumable_uri']
         if resumable_uri:
             self.resumable_uri = resumable_uri
-        request.resumable_uri=self.resumable_uri
+        if self.resumable_state and self.resumable_state['resumable_uri'] == self.resumable_uri:
+            request.resumable_state = self.resumable_state
+        else:
+            request.resumable_uri = self.resumable_uri
             
         response = None
+        try:
+            while not response:
+                try:
+                    status, response = request.next_chunk()
+                except CheckSumError:
+                    self.resumable_uri = None
+                    self.resumable_state = None
+                    raise
+                self.resumable_uri = request.resumable_uri
+                self.resumable_state = request.resumable_state
+                if status and progress_handler:
+                    progress_handler(status)
+        finally:
+            request.close()
+        self._uploaded(json.loads(response))
+        self.resumable_uri = None
+        self.resumable_state = None
+
+    def _upload_metadata(self) -> dict:
+        if self.id:
+            # A new revision keeps name and parents
+            return {}
+        return {
+            'name': self.name,
+            'parents': self.parent_ids
+        }
+
+    def _uploaded(self, result: dict):
+        self.id = result['id']
+        self.name = result['name']
+        self.drive._forget_misses(self.parent_ids, self.name)
+        self._metadata.clear()
+        self._hydrate(result)
+
+    @needs_id
+    def _keep_head_revision(self):
+        """Mark the current revision to be kept forever. keepRevisionForever
+        of an upload would only pin the new revision."""
+        try:
+            result = self.drive.service.files().get(fileId=self.id, fields='headRevisionId').execute(http=self.drive.http)
+            if 'headRevisionId' in result:
+                # Google Docs have no binary revisions
+                self.drive.service.revisions().update(
+                                    fileId=self.id,
+                                    revisionId=result['headRevisionId'],
+                                    body={'keepForever': True},
+                                    fields='id'
+                                ).execute(http=self.drive.http)
+        except HttpError as err:
+            raise GoogleDriveAPIError.from_http_error(err)
+
+    def _upload_multipart(self, media, local_md5, progress_handler=None):
+        size = media.size()
+        fields = ', '.join((self.drive.default_fields, self.drive.metadata_fields))
+        bandwidth_limiter.upload.consume(size)
+        try:
+            if self.id:
+                result = self.drive.service.files().update(
+                                    fileId=self.id,
+                                    media_body=media,
+                                    fields=fields
+                                ).execute(http=self.drive.http)
+            else:
+                result = self.drive.service.files().create(
+                                    body=self._upload_metadata(),
+                                    media_body=media,
+                                    fields=fields
+                                ).execute(http=self.drive.http)
+        except HttpError as err:
+            raise GoogleDriveAPIError.from_http_error(err)
+        logger.debug("Local MD5: %s", local_md5)
+        logger.debug("Remote MD5: %s", result['md5Checksum'])
+        if result['md5Checksum'] != local_md5:
+            if not self.id:
+                try:
+                    self.drive.service.files().delete(fileId=result['id']).execute(http=self.drive.http)
+                except HttpError as err:
+                    raise GoogleDriveAPIError.from_http_error(err)
+            raise CheckSumError("Checksum mismatch. Need to repeat upload.")
+        self._uploaded(result)
+        if progress_handler:
+            progress_handler(ResumableMediaUploadProgress(size, size, None))
+
+    def upload_stream(self, stream, chunksize=None, progress_handler=None, keep_revision=False):
+        """Upload from a readable object or an iterator of bytes, e.g. a
+        pipe or an archive being written, without knowing its length in
+        advance. Everything is read exactly once and only the current
+        chunk is held in memory. As the stream can't be rewound, an
+        interrupted stream upload can't be resumed. Existing files get a
+        new revision like with upload()."""
+        chunksize, adaptive_chunksize = self._upload_chunksize(chunksize)
+        media = _StreamMedia(stream, chunksize)
+        if keep_revision and self.id:
+            self._keep_head_revision()
+        if not media.getbytes(0, 1):
+            if self.id:
+                empty = MediaIoBaseUpload(io.BytesIO(), mimetype='application/octet-stream')
+                self._upload_multipart(empty, hashlib.md5().hexdigest(), progress_handler)
+            else:
+                self.upload_empty()
+            return
+
+        request = ResumableUploadRequest(self.drive.service, media_body=media, body=self._upload_metadata(),
+                                            chunksize=adaptive_chunksize, http=self.drive.http,
+                                            fields=', '.join((self.drive.default_fields, self.drive.metadata_fields)),
+                                            file_id=self.id)
+        response = None
         while not response:
-            try:
-                status, response = request.next_chunk()
-            except CheckSumError:
-                self.resumable_uri = None
-                raise
-            self.resumable_uri = request.resumable_uri
+            status, response = request.next_chunk()
             if status and progress_handler:
                 progress_handler(status)
-        result = json.loads(response)
-        self.id = result['id']
-        self.name = result['name']
-        self.resumable_uri = None
+        self._uploaded(json.loads(response))
+
+    @staticmethod
+    def _upload_chunksize(chunksize):
+        if not chunksize:
+            chunksize = defaultChunksize
+        adaptive_chunksize = None
+        if isinstance(chunksize, AdaptiveChunksize):
+            adaptive_chunksize = chunksize
+            chunksize = adaptive_chunksize.aligned(minimalChunksize)
+        return chunksize, adaptive_chunksize
 
     def upload_empty(self):
         file_metadata = {
@@ -568,11 +1403,12 @@ class DriveFile(DriveItem):
             'parents': self.parent_ids
         }
         try:
-            result = self.drive.service.files().create(body=file_metadata, fields=self.drive.default_fields).execute()
+            result = self.drive.service.files().create(body=file_metadata, fields=self.drive.default_fields).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
         self.id = result['id']
         self.name = result['name']
+        self.drive._forget_misses(self.parent_ids, self.name)
 
     def copy(self, dest=None, new_name=None, ignore_existing=False):
         if not dest:
@@ -593,28 +1429,47 @@ class DriveFile(DriveItem):
                                     "name": new_name,
                                     "parents": [dest.id]
                                 },
-                                fields=self.drive.default_fields,
-                                ).execute()
+                                fields=', '.join((self.drive.default_fields, self.drive.metadata_fields)),
+                                ).execute(http=self.drive.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
         return dest._reply_to_object(result)
        
     @property
     def md5sum(self):
-        if not hasattr(self, "_md5sum"):
-            self._md5_sum = self.meta_get("md5Checksum")["md5Checksum"]
-        return self._md5_sum
+        if 'md5Checksum' not in self._metadata:
+            self._metadata.update(self.meta_get("md5Checksum"))
+        return self._metadata['md5Checksum']
        
     @property
     def size(self):
-        if not hasattr(self, "_size"):
-            self._size = int(self.meta_get("size")["size"])
-        return self._size
+        if 'size' not in self._metadata:
+            self._metadata.update(self.meta_get("size"))
+        return int(self._metadata['size'])
 
 class DriveShortcut(DriveItem):
-    def __init__(self, drive, parent_ids, filename, file_id, target_id, spaces='drive'):
+    def __init__(self, drive, parent_ids, filename, file_id, target_id=None, spaces='drive'):
         super().__init__(drive, parent_ids, filename, file_id, spaces)
-        self.target = self.drive.item_by_id(target_id)
+        self.target_id = target_id
+        self._target = None
+
+    @property
+    def target(self) -> DriveItem:
+        """The item the shortcut points to, looked up on first use. If the
+        shortcut was listed without shortcutDetails, its target id is
+        requested first."""
+        if self._target is None:
+            if self.target_id is None:
+                try:
+                    result = self.drive.service.files().get(
+                                            fileId=self.id,
+                                            fields='shortcutDetails(targetId)'
+                                        ).execute(http=self.drive.http)
+                except HttpError as err:
+                    raise GoogleDriveAPIError.from_http_error(err)
+                self.target_id = result['shortcutDetails']['targetId']
+            self._target = self.drive.item_by_id(self.target_id)
+        return self._target
 
     def isshortcut(self) -> bool:
         return True
@@ -634,17 +1489,248 @@ class DriveShortcut(DriveItem):
     def __getattr__(self, name):
         return getattr(self.target, name)
 
+class _StreamMedia(MediaUpload):
+    """Media source reading a stream of unknown length once, front to
+    back. Only the data the server hasn't confirmed yet is kept in memory,
+    so getbytes() can't go back before the last offset it was asked for.
+    size() stays None until the end of the stream has been read.
+    Empty items of an iterator are skipped, and None from the read() of a
+    non-blocking stream means no data is available yet."""
+    def __init__(self, stream, chunksize=defaultChunksize):
+        if hasattr(stream, 'read'):
+            self._read = stream.read
+        else:
+            iterator = iter(stream)
+            self._read = lambda length: next((data for data in iterator if data), b'')
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        self._offset = 0
+        self._size = None
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return 'application/octet-stream'
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        if begin < self._offset:
+            raise ValueError("Stream was already read past offset {}".format(begin))
+        del self._buffer[:begin-self._offset]
+        self._offset = begin
+        # One byte more than asked for, to know if this is the last chunk
+        while self._size is None and len(self._buffer) <= length:
+            data = self._read(length+1-len(self._buffer))
+            if data is None:
+                time.sleep(0.01)
+                continue
+            if not data:
+                self._size = self._offset + len(self._buffer)
+            self._buffer += data
+        return bytes(self._buffer[:length])
+
+
+class _MmapMedia(MediaUpload):
+    """Media source mapping the local file into memory. getbytes() returns
+    memoryview slices of the mapping, so chunks reach the socket and the
+    hasher without being copied. The file must not shrink while it is
+    mapped, reading a truncated page kills the process with SIGBUS."""
+    def __init__(self, filename, chunksize=defaultChunksize):
+        self._filename = filename
+        self._chunksize = chunksize
+        with open(filename, 'rb') as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return 'application/octet-stream'
+
+    def size(self):
+        return len(self._mmap)
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        return self._view[begin:begin+length]
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Slices are still referenced, the mapping goes with the last one
+            pass
+
+
+class _PrefetchMedia(MediaUpload):
+    """Media source that reads the chunks following the one being sent on
+    a background thread, into a pool of buffers that are reused. At most
+    `memory` bytes are buffered, but at least room for two chunks: one
+    being sent, one being filled. max_chunksize() keeps growing chunks
+    within that. A buffer handed out by getbytes() is recycled on the
+    next call. Reads out of sequence, e.g. after a resume or a change of
+    chunksize, drop what was read ahead."""
+    def __init__(self, filename, chunksize=defaultChunksize, memory=defaultChunksize*2):
+        self._filename = filename
+        self._chunksize = chunksize
+        self._size = os.path.getsize(filename)
+        self._fh = open(filename, 'rb', buffering=0)
+        self._memory = max(memory, 2*chunksize)
+        self._free = []
+        self._pending = collections.deque()
+        self._ready = dict()
+        self._current = None
+        self._reading = None
+        self._wanted = None
+        # Bytes of all buffers, free or in use
+        self._allocated = 0
+        self._generation = 0
+        self._error = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._reader = threading.Thread(target=self._read_ahead, daemon=True)
+        self._reader.start()
+
+    def chunksize(self):
+        return self._chunksize
+
+    def max_chunksize(self):
+        """Largest chunk that leaves room for reading the next one ahead"""
+        return max(minimalChunksize, self._memory // 2 // minimalChunksize * minimalChunksize)
+
+    def mimetype(self):
+        return 'application/octet-stream'
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        length = min(length, self._size-begin)
+        with self._condition:
+            if self._current is not None:
+                self._free.append(self._current)
+                self._current = None
+            ready = self._ready.get(begin)
+            if not (ready and ready[0] == length or (begin, length) in self._pending
+                        or self._reading == (begin, length)):
+                for _, buffer, _ in self._ready.values():
+                    self._free.append(buffer)
+                self._ready.clear()
+                self._pending.clear()
+                self._reading = None
+                self._generation += 1
+                self._pending.append((begin, length))
+            self._wanted = begin
+            self._condition.notify_all()
+            while begin not in self._ready and self._error is None:
+                self._condition.wait()
+            self._wanted = None
+            if self._error:
+                raise self._error
+            _, buffer, filled = self._ready.pop(begin)
+            self._current = buffer
+
+            # Read ahead as far as the memory allows besides this chunk
+            scheduled = [offset for offset, _ in self._pending] + list(self._ready)
+            if self._reading:
+                scheduled.append(self._reading[0])
+            position = max(scheduled)+length if scheduled else begin+length
+            while (len(scheduled)+2)*length <= self._memory and position < self._size:
+                self._pending.append((position, min(length, self._size-position)))
+                scheduled.append(position)
+                position += length
+            self._condition.notify_all()
+        return memoryview(buffer)[:filled]
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._reader.join()
+        self._fh.close()
+
+    def _buffer_available(self, length) -> bool:
+        if any(len(buffer) >= length for buffer in self._free):
+            return True
+        free_bytes = sum(len(buffer) for buffer in self._free)
+        # The chunk getbytes() waits for is read in any case
+        return self._allocated - free_bytes + length <= self._memory or self._pending[0][0] == self._wanted
+
+    def _take_buffer(self, length) -> bytearray:
+        for buffer in self._free:
+            if len(buffer) >= length:
+                self._free.remove(buffer)
+                return buffer
+        # None fits, make room by dropping the free ones
+        self._allocated -= sum(len(buffer) for buffer in self._free)
+        self._free.clear()
+        self._allocated += length
+        return bytearray(length)
+
+    def _read_ahead(self):
+        while True:
+            with self._condition:
+                while not self._closed and not (self._pending and self._buffer_available(self._pending[0][1])):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                offset, length = self._pending.popleft()
+                self._reading = (offset, length)
+                generation = self._generation
+                buffer = self._take_buffer(length)
+            try:
+                self._fh.seek(offset)
+                filled = self._fh.readinto(memoryview(buffer)[:length])
+            except Exception as err:
+                with self._condition:
+                    self._error = err
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._reading = None
+                if generation == self._generation:
+                    self._ready[offset] = (length, buffer, filled)
+                else:
+                    # Read ahead of a sequence that was dropped meanwhile
+                    self._free.append(buffer)
+                self._condition.notify_all()
+
+
 class ResumableUploadRequest:
     # TODO: actually implement interface for http_request
     # TODO: error handling
-    def __init__(self, service, media_body, body, upload_id=None):
+    max_checkpoints = 8
+
+    def __init__(self, service, media_body, body, upload_id=None, chunksize=None, http=None, fingerprint=None,
+                    fields='id, name, md5Checksum', file_id=None):
         self.service = service
+        self.file_id = file_id
+        self.http = http or service._http
         self.media_body = media_body
         self.body = body
+        self.chunksize = chunksize
+        self.fields = fields
+        self.fingerprint = fingerprint
         self.upload_id=upload_id
         self._resumable_progress = None
         self._resumable_uri = None
         self._range_md5 = None
+        self._checkpoints = []
+        self._hasher = None
+        self._pending_checks = []
 
     @property
     def upload_id(self):
@@ -659,8 +1745,15 @@ class ResumableUploadRequest:
     @property
     def resumable_uri(self):
         if self._resumable_uri is None:
-            api_url = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable" 
-            status, resp = self.service._http.request(api_url, method='POST', headers={'Content-Type':'application/json; charset=UTF-8'}, body=json.dumps(self.body)) 
+            # The final response of the session carries these fields
+            if self.file_id:
+                # New revision of an existing file
+                api_url = "https://www.googleapis.com/upload/drive/v3/files/{}?uploadType=resumable&fields={}".format(self.file_id, quote(self.fields))
+                method = 'PATCH'
+            else:
+                api_url = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&fields={}".format(quote(self.fields))
+                method = 'POST'
+            status, resp = self.http.request(api_url, method=method, headers={'Content-Type':'application/json; charset=UTF-8'}, body=json.dumps(self.body)) 
             if status['status'] != '200':
                 raise GoogleDriveAPIError.from_reply(status, resp)
             self._resumable_uri = status['location']
@@ -669,13 +1762,90 @@ class ResumableUploadRequest:
     @resumable_uri.setter
     def resumable_uri(self, resumable_uri):
         self._resumable_uri = resumable_uri
-        
+
+    @property
+    def resumable_state(self) -> dict:
+        """JSON serializable state to resume the upload with. Besides the
+        resumable_uri it holds the last prefix checksums the server
+        confirmed, so a resume of the same unmodified local file needn't
+        hash the uploaded prefix before continuing."""
+        return {
+            'resumable_uri': self._resumable_uri,
+            'fingerprint': self.fingerprint,
+            'checkpoints': list(self._checkpoints),
+        }
+
+    @resumable_state.setter
+    def resumable_state(self, state: dict):
+        self.resumable_uri = state['resumable_uri']
+        if self.fingerprint is not None and state.get('fingerprint') == self.fingerprint:
+            self._checkpoints = [list(checkpoint) for checkpoint in state.get('checkpoints', [])]
+        else:
+            self._checkpoints = []
+
+    def _add_checkpoint(self, position, md5):
+        self._checkpoints.append([position, md5])
+        del self._checkpoints[:-self.max_checkpoints]
+
+    def _start_hasher(self, position) -> bool:
+        """Hash the uploaded prefix on a background thread instead of
+        before continuing. Needs the media to be backed by a file."""
+        path = getattr(self.media_body, '_filename', None)
+        if path is None:
+            return False
+        self._hasher = _FileHasher(path)
+        self._hasher.mark(position)
+        self._hasher.advance(position)
+        return True
+
+    def _check_range_md5(self, position, remote_md5):
+        logger.debug("Remote MD5 (0-%d): %s", position, remote_md5)
+        if self._hasher is None:
+            logger.debug("Local MD5 (0-%d): %s", position, self._range_md5.hexdigest())
+            if remote_md5 != self._range_md5.hexdigest():
+                raise CheckSumError("Checksum mismatch. Need to repeat upload.")
+            self._add_checkpoint(position, remote_md5)
+        else:
+            # Verified once the background hasher gets there
+            self._pending_checks.append((position, remote_md5))
+            self._verify_pending_checks()
+
+    def _verify_pending_checks(self):
+        while self._pending_checks and self._pending_checks[0][0] in self._hasher.digests:
+            position, remote_md5 = self._pending_checks.pop(0)
+            if self._hasher.digests[position] != remote_md5:
+                raise CheckSumError("Checksum mismatch. Need to repeat upload.")
+            self._add_checkpoint(position, remote_md5)
+
+    def _max_chunksize(self) -> int:
+        """Limit of the media source on the length of a chunk, if any"""
+        if hasattr(self.media_body, 'max_chunksize'):
+            return self.media_body.max_chunksize()
+        return None
+
+    def _local_md5(self) -> str:
+        if self._hasher is None:
+            return self._range_md5.hexdigest()
+        local_md5 = self._hasher.hexdigest()
+        self._verify_pending_checks()
+        return local_md5
+
+    def close(self):
+        if self._hasher:
+            self._hasher.cancel()
+        if hasattr(self.media_body, 'close'):
+            self.media_body.close()
             
     @property
     def resumable_progress(self):
+        if self._resumable_progress is None and self._resumable_uri is None:
+            # A new session has nothing to ask the server about yet
+            self.resumable_uri
+            self._resumable_progress = 0
+            self._range_md5 = hashlib.md5()
         if self._resumable_progress is None:
-            upload_range = "bytes */{}".format(self.media_body.size())
-            status, resp = self.service._http.request(self.resumable_uri, method='PUT', headers={'Content-Length':'0', 'Content-Range':upload_range})
+            upload_range = "bytes */{}".format(self._total_size())
+            status, resp = self.http.request(self.resumable_uri, method='PUT', headers={'Content-Length':'0', 'Content-Range':upload_range})
             
             if status['status'] not in ('200', '308'):
                 #Should 404 result in a FileNotFound error?
@@ -683,6 +1853,7 @@ class ResumableUploadRequest:
 
             self._range_md5 = hashlib.md5()
             def file_in_chunks(start_byte: int, end_byte: int, chunksize: int = 4*1024**2):
+                chunksize = min(chunksize, self._max_chunksize() or chunksize)
                 while start_byte < end_byte:
                     content_length = min(chunksize, end_byte-start_byte)
                     yield self.media_body.getbytes(start_byte, content_length)
@@ -696,12 +1867,14 @@ class ResumableUploadRequest:
             elif 'range' in status.keys():
                 self._resumable_progress = int(status['range'].replace('bytes=0-', '', 1))+1
 
-                for chunk in file_in_chunks(0, self._resumable_progress):
-                    self._range_md5.update(chunk)
-                logger.debug("Local MD5 (0-%d): %s", self._resumable_progress, self._range_md5.hexdigest())
-                logger.debug("Remote MD5 (0-%d): %s", self._resumable_progress, status['x-range-md5'])
-                if status['x-range-md5'] != self._range_md5.hexdigest():
-                    raise CheckSumError("Checksum mismatch. Need to repeat upload.")
+                if [self._resumable_progress, status['x-range-md5']] in self._checkpoints \
+                        and self._start_hasher(self._resumable_progress):
+                    logger.debug("Remote MD5 (0-%d) matches checkpoint", self._resumable_progress)
+                    self._pending_checks.append((self._resumable_progress, status['x-range-md5']))
+                else:
+                    for chunk in file_in_chunks(0, self._resumable_progress):
+                        self._range_md5.update(chunk)
+                    self._check_range_md5(self._resumable_progress, status['x-range-md5'])
 
             else:
                 self._resumable_progress = 0
@@ -713,35 +1886,195 @@ class ResumableUploadRequest:
         self._resumable_progress = resumable_progress
 
     def next_chunk(self):
-        content_length = min(self.media_body.size()-self.resumable_progress, self.media_body.chunksize()) 
-        upload_range = "bytes {}-{}/{}".format(self.resumable_progress, self.resumable_progress+content_length-1, self.media_body.size()) 
-        content = self.media_body.getbytes(self.resumable_progress, content_length)
-        status, resp = self.service._http.request(self.resumable_uri, method='PUT', headers={'Content-Length':str(content_length), 'Content-Range':upload_range}, body=content)
+        if self.chunksize:
+            # Chunks other than the last one must be multiples of 256 KiB
+            chunksize = self.chunksize.aligned(minimalChunksize)
+        else:
+            chunksize = self.media_body.chunksize()
+        chunksize = min(chunksize, self._max_chunksize() or chunksize)
+        content = self.media_body.getbytes(self.resumable_progress, chunksize)
+        content_length = len(content)
+        upload_range = "bytes {}-{}/{}".format(self.resumable_progress, self.resumable_progress+content_length-1, self._total_size())
+        bandwidth_limiter.upload.consume(content_length)
+        started = time.monotonic()
+        try:
+            status, resp = self.http.request(self.resumable_uri, method='PUT', headers={'Content-Length':str(content_length), 'Content-Range':upload_range}, body=content)
+        except Exception:
+            if self.chunksize:
+                self.chunksize.failed()
+            raise
+        if self.chunksize:
+            if status['status'] in ('200', '308'):
+                self.chunksize.update(content_length, time.monotonic()-started)
+            else:
+                self.chunksize.failed()
         if status['status'] in ('200', '308'):
-            self._range_md5.update(content)
-            logger.debug("Local MD5 (0-%d): %s", self.resumable_progress+content_length, self._range_md5.hexdigest())
+            accepted = content_length
             if status['status'] == '308':
-                logger.debug("Remote MD5 (0-%d): %s", self.resumable_progress+content_length, status['x-range-md5'])
-                if status['x-range-md5'] != self._range_md5.hexdigest():
-                    raise CheckSumError("Checksum mismatch. Need to repeat upload.")
-                self.resumable_progress += content_length
+                # The server may keep only part of the chunk, the rest is sent again
+                if 'range' in status:
+                    accepted = int(status['range'].replace('bytes=0-', '', 1))+1-self.resumable_progress
+                else:
+                    accepted = 0
+            if accepted:
+                if self._hasher:
+                    self._hasher.mark(self.resumable_progress+accepted)
+                    self._hasher.advance(self.resumable_progress+accepted)
+                else:
+                    self._range_md5.update(content[:accepted])
+            if status['status'] == '308':
+                if accepted:
+                    self._check_range_md5(self.resumable_progress+accepted, status['x-range-md5'])
+                self.resumable_progress += accepted
             elif status['status'] == '200':
                 self.resumable_progress = self.media_body.size()
                 result = json.loads(resp)
-                try:
-                    remote_md5 = self.service.files().get(fileId=result['id'], fields="md5Checksum").execute()['md5Checksum']
-                except HttpError as e:
-                    if e.resp.status == 404:
-                        raise FileNotFoundError("File was successfully uploaded but since has been deleted")
-                    else:
-                        raise GoogleDriveAPIError.from_http_error(e)
+                if 'md5Checksum' in result:
+                    remote_md5 = result['md5Checksum']
+                else:
+                    # Session was started without asking for the checksum
+                    try:
+                        remote_md5 = self.service.files().get(fileId=result['id'], fields="md5Checksum").execute(http=self.http)['md5Checksum']
+                    except HttpError as e:
+                        if e.resp.status == 404:
+                            raise FileNotFoundError("File was successfully uploaded but since has been deleted")
+                        else:
+                            raise GoogleDriveAPIError.from_http_error(e)
                 logger.debug("Remote MD5 (0-%d): %s", self.resumable_progress, remote_md5)
-                if remote_md5 != self._range_md5.hexdigest():
+                if remote_md5 != self._local_md5():
                     raise CheckSumError("Final checksum mismatch. Need to repeat upload.")
         else:
             raise GoogleDriveAPIError.from_reply(status, resp)
             
-        return ResumableMediaUploadProgress(self.resumable_progress, self.media_body.size(), self.resumable_uri), resp
+        return ResumableMediaUploadProgress(self.resumable_progress, self.media_body.size(), self.resumable_uri, chunksize, self.resumable_state), resp
+
+    def _total_size(self) -> str:
+        # Streams are sent with an unknown total until their end is read
+        size = self.media_body.size()
+        return '*' if size is None else str(size)
+
+
+class DriveSnapshot:
+    """Point-in-time index of every non-trashed item of a drive, built
+    from a full listing by GoogleDrive.snapshot(). Paths, children and
+    resolve() are answered from memory without API calls. Items are kept
+    as compact tuples; DriveItem objects are only created on access and
+    are not added to the caches of the drive."""
+    def __init__(self, drive: GoogleDrive, spaces='drive'):
+        self.drive = drive
+        self.spaces = spaces
+        self.root_id = drive.id
+        self.created = datetime.now()
+        # id -> (name, parents, mimeType, shortcut target, metadata)
+        self._items = dict()
+        # parent id -> name -> [ids]
+        self._children = dict()
+
+    def _add(self, reply: dict):
+        metadata = tuple(reply.get(field) for field in ('size', 'md5Checksum', 'modifiedTime'))
+        parents = tuple(reply.get('parents', ()))
+        self._items[reply['id']] = (
+                                reply['name'],
+                                parents,
+                                reply['mimeType'],
+                                reply.get('shortcutDetails', {}).get('targetId'),
+                                metadata if any(metadata) else None
+                            )
+        for parent_id in parents:
+            self._children.setdefault(parent_id, dict()).setdefault(reply['name'], []).append(reply['id'])
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, id_):
+        return id_ in self._items or id_ == self.root_id
+
+    def item(self, id_) -> DriveItem:
+        if id_ == self.root_id:
+            return self.drive
+        try:
+            name, parents, mime_type, target_id, metadata = self._items[id_]
+        except KeyError:
+            raise FileNotFoundError(id_)
+        reply = {
+            'id': id_,
+            'name': name,
+            'parents': list(parents),
+            'mimeType': mime_type,
+            'spaces': self.spaces.split(','),
+        }
+        if target_id:
+            reply['shortcutDetails'] = {'targetId': target_id}
+        if metadata:
+            reply.update((field, value) for field, value in zip(('size', 'md5Checksum', 'modifiedTime'), metadata) if value)
+        # Point-in-time data must not replace fresher items in the caches
+        return self.drive._build_object(reply)
+
+    def child(self, parent, name) -> DriveItem:
+        return self.item(self._child_id(self._id(parent), name))
+
+    def children(self, parent) -> Iterator(DriveItem):
+        for ids in self._children.get(self._id(parent), {}).values():
+            for id_ in ids:
+                yield self.item(id_)
+
+    def child_from_path(self, path, parent=None) -> DriveItem:
+        """Like DriveFolder.child_from_path(), relative to parent or the
+        root of the drive."""
+        id_ = self.root_id if parent is None else self._id(parent)
+        for name in path.strip('/').split('/'):
+            if name in ('', '.'):
+                continue
+            if id_ != self.root_id and self._items[id_][2] != 'application/vnd.google-apps.folder':
+                raise NotADirectoryError(name)
+            if name == '..':
+                parents = self._items[id_][1] if id_ != self.root_id else ()
+                id_ = parents[0] if parents else id_
+            else:
+                id_ = self._child_id(id_, name)
+        return self.item(id_)
+
+    def resolve(self, item) -> str:
+        names = []
+        id_ = self._id(item)
+        while id_ != self.root_id:
+            try:
+                name, parents, _, _, _ = self._items[id_]
+            except KeyError:
+                raise FileNotFoundError("{} is not below the root of the drive".format(id_))
+            names.append(name)
+            if not parents:
+                raise FileNotFoundError("{} is not below the root of the drive".format(id_))
+            id_ = parents[0]
+        return '/' + '/'.join(reversed(names))
+
+    def walk(self, top=None):
+        """Like os.walk(), yields (path, folders, files) for top and every
+        folder below it, top-down. Removing folders from the list skips
+        them."""
+        top_id = self.root_id if top is None else self._id(top)
+        pending = [(self.resolve(top_id), top_id)]
+        while pending:
+            path, id_ = pending.pop()
+            folders = []
+            files = []
+            for item in self.children(id_):
+                (folders if item.isfolder() else files).append(item)
+            yield path, folders, files
+            for folder in reversed(folders):
+                pending.append(('/'.join((path.rstrip('/'), folder.name)), folder.id))
+
+    def _id(self, item) -> str:
+        return item if isinstance(item, str) else item.id
+
+    def _child_id(self, parent_id, name) -> str:
+        ids = self._children.get(parent_id, {}).get(name, [])
+        if not ids:
+            raise FileNotFoundError(name)
+        if len(ids) > 1:
+            raise AmbiguousPathError("Two or more files {name}".format(name=name),
+                                        duplicates=(self.item(id_) for id_ in ids))
+        return ids[0]
 
 
 class GoogleDrive(DriveFolder):
@@ -779,7 +2112,23 @@ class GoogleDrive(DriveFolder):
             except (AssertionError, KeyError):
                 raise InvalidUrlError(url)
 
-    def __init__(self, creds, autorefresh=True, caching=1000):
+    def __init__(self, creds, autorefresh=True, caching=1000, cache: PersistentCache = None, name_cache_ttl=60, miss_cache_ttl=10,
+                    id_cache_ttl=float('inf'), id_cache_size=None, name_cache_size=None, miss_cache_size=None,
+                    id_cache_max_bytes=None, name_cache_max_bytes=None, miss_cache_max_bytes=None,
+                    id_cache: MutableMapping = None, name_cache: MutableMapping = None, miss_cache: MutableMapping = None):
+        """caching is the number of entries of each in-memory cache, unless
+        id_cache_size, name_cache_size or miss_cache_size set it for one of
+        them. *_max_bytes additionally limit a cache by the estimated
+        memory its entries use. With a PersistentCache the id and name
+        caches are backed by a file shared between processes, so resolving
+        paths needn't start cold every time. Names are cached for name_cache_ttl seconds; when the caches
+        are kept up to date with apply_changes() or a ChangeFollower, that
+        can be float('inf'). Names that were not found are remembered for
+        miss_cache_ttl seconds, unless they are created through this
+        instance in the meantime.
+        id_cache, name_cache and miss_cache replace the default caches by
+        any mapping, e.g. a different implementation. Their own limits
+        take the place of the settings above."""
         try:
             self.creds = Credentials.from_json(creds)
         except TypeError:
@@ -789,19 +2138,39 @@ class GoogleDrive(DriveFolder):
                 and autorefresh:
             self.creds.refresh(Request())
 
-        http = google_auth_httplib2.AuthorizedHttp(self.creds)
-
-        #see bug https://github.com/googleapis/google-api-python-client/issues/803#issuecomment-578151576
-        http.http.redirect_codes = set(http.http.redirect_codes) - {308}
-
-        self._service = build('drive', 'v3', http=http)
-
-        self._id_cache = ExpiringDict(max_len=caching, max_age_seconds=float('inf'))
-        self._name_cache = ExpiringDict(max_len=caching, max_age_seconds=60)
+        self._local = threading.local()
+        self._local.http = self._authorized_http()
+        self._service = build('drive', 'v3', http=self._local.http)
+
+        def lru_cache(ttl, size, max_bytes):
+            return LRUCache(max_len=size if size is not None else caching,
+                            max_age=timedelta(seconds=ttl) if ttl != float('inf') else None,
+                            max_bytes=max_bytes)
+        self._id_cache = id_cache if id_cache is not None \
+                            else lru_cache(id_cache_ttl, id_cache_size, id_cache_max_bytes)
+        self._name_cache = name_cache if name_cache is not None \
+                            else lru_cache(name_cache_ttl, name_cache_size, name_cache_max_bytes)
+        self._miss_cache = miss_cache if miss_cache is not None \
+                            else lru_cache(miss_cache_ttl, miss_cache_size, miss_cache_max_bytes)
+        # item id -> keys of the name cache that may point to it
+        self._name_keys = dict()
+        self.cache = cache
+        # Persisted names are as reliable as cached ones for as long
+        self._name_cache_ttl = timedelta(seconds=name_cache_ttl) if name_cache_ttl != float('inf') else None
+        self._changes_token = None
 
         self.id = None
         self.drive = self
         self.default_fields = 'id, name, mimeType, parents, spaces, shortcutDetails'
+        self.metadata_fields = 'size, md5Checksum, modifiedTime'
+        # Named field masks for listings and lookups. Every profile needs
+        # at least the fields of 'minimal'; items listed without
+        # shortcutDetails look up their target when it is first used.
+        self.field_profiles = {
+            'minimal': 'id, name, mimeType, parents',
+            'default': self.default_fields,
+            'metadata': ', '.join((self.default_fields, self.metadata_fields)),
+        }
         root_folder = self.item_by_id("root")
 
         super().__init__(self, root_folder.parent_ids, root_folder.name, root_folder.id, root_folder.spaces)
@@ -813,49 +2182,245 @@ class GoogleDrive(DriveFolder):
     def service(self):
         return self._service
 
+    @property
+    def http(self):
+        """Authorized http object of the calling thread. httplib2 is not
+        thread-safe, so each thread gets a connection of its own."""
+        if not hasattr(self._local, 'http'):
+            self._local.http = self._authorized_http()
+        return self._local.http
+
+    def _authorized_http(self):
+        http = google_auth_httplib2.AuthorizedHttp(self.creds)
+
+        #see bug https://github.com/googleapis/google-api-python-client/issues/803#issuecomment-578151576
+        http.http.redirect_codes = set(http.http.redirect_codes) - {308}
+        return http
+
     def json_creds(self):
         return Credentials.to_json(self.creds)
 
-    def items_by_query(self, query, pageSize=100, orderBy=None, spaces='drive', skip=0) -> DriveItem:
+    def items_by_query(self, query, pageSize=100, orderBy=None, spaces='drive', skip=0, metadata=False, profile=None) -> DriveItem:
+        """profile names the fields to request, see field_profiles.
+        metadata=True is short for profile='metadata'. Metadata in the
+        listing is stored on the returned items."""
         pageSize = min(1000, max(pageSize, skip))
+        fields = self._profile_fields(profile, metadata)
         result = {'nextPageToken': ''}
         while "nextPageToken" in result:
             try:
                 result = self.service.files().list(
                         pageSize=pageSize,
                         spaces=spaces,
-                        fields="nextPageToken, files({})".format(self.default_fields),
+                        fields="nextPageToken, files({})".format(fields),
                         q=query,
                         pageToken=result['nextPageToken'],
                         orderBy=orderBy,
-                    ).execute()
+                    ).execute(http=self.http)
             except HttpError as err:
                 raise GoogleDriveAPIError.from_http_error(err)
-            items = result.get('files', [])
-
-            for i, file_ in enumerate(items):
-                if skip > i:
-                    continue
-                if skip == i:
-                    pageSize = 100
-                yield self._reply_to_object(file_)
+            items = result.get('files', [])[skip:]
+            if items:
+                pageSize = 100
+
+            for file_ in items:
+                file_.setdefault('spaces', spaces.split(','))
+            # Persist the page at once instead of an item at a time
+            if self.cache:
+                self.cache.put_items([self._structural(file_) for file_ in items])
+            for file_ in items:
+                yield self._reply_to_object(file_, persist=False)
+
+    def names_by_query(self, query, spaces='drive') -> Iterator(str):
+        """Names of the items matching query. Only the names are
+        requested, and no items are built or cached."""
+        result = {'nextPageToken': ''}
+        while "nextPageToken" in result:
+            try:
+                result = self.service.files().list(
+                        pageSize=1000,
+                        spaces=spaces,
+                        fields="nextPageToken, files(name)",
+                        q=query,
+                        pageToken=result['nextPageToken'],
+                    ).execute(http=self.http)
+            except HttpError as err:
+                raise GoogleDriveAPIError.from_http_error(err)
+            for file_ in result.get('files', []):
+                yield file_['name']
 
-    def item_by_id(self, id_) -> DriveItem:
+    def item_by_id(self, id_, profile=None) -> DriveItem:
+        """profile names the fields to request if the item isn't cached,
+        see field_profiles"""
         if hasattr(self, 'id') and id_ == self.id:
             return self
 
-        if id_ in self._id_cache:
+        item = self._id_cache.get(id_)
+        if item is not None:
             logger.debug("Found {} in id cache".format((id_)))
-            return self._id_cache[id_]
+            return item
+
+        if self.cache:
+            reply = self.cache.get_item(id_)
+            if reply:
+                logger.debug("Found {} in persistent cache".format((id_)))
+                item = self._reply_to_object(reply, persist=False)
+                self._id_cache[id_] = item
+                return item
 
         try:
             result = self.service.files().get(
                                     fileId=id_,
-                                    fields=self.default_fields
-                                ).execute()
+                                    fields=self._profile_fields(profile)
+                                ).execute(http=self.http)
         except HttpError as err:
             raise GoogleDriveAPIError.from_http_error(err)
-        return self._reply_to_object(result)
+        item = self._reply_to_object(result)
+        if id_ != item.id:
+            # Requested by an alias like 'root'
+            self._id_cache[id_] = item
+            if self.cache:
+                self.cache.put_item(result, id_)
+        return item
+
+    def snapshot(self, spaces='drive', metadata=False, profile=None) -> DriveSnapshot:
+        """List every non-trashed item of the drive with large pages and
+        index them in a DriveSnapshot. With metadata=True, size,
+        md5Checksum and modifiedTime are included. profile='minimal'
+        saves transfer on large drives."""
+        snapshot = DriveSnapshot(self, spaces)
+        fields = self._profile_fields(profile, metadata)
+        result = {'nextPageToken': ''}
+        while 'nextPageToken' in result:
+            try:
+                result = self.service.files().list(
+                        pageSize=1000,
+                        spaces=spaces,
+                        fields="nextPageToken, files({})".format(fields),
+                        q="trashed = false",
+                        pageToken=result['nextPageToken'],
+                    ).execute(http=self.http)
+            except HttpError as err:
+                raise GoogleDriveAPIError.from_http_error(err)
+            for reply in result.get('files', []):
+                snapshot._add(reply)
+        return snapshot
+
+    def apply_changes(self, spaces='drive') -> int:
+        """Update the caches with everything that changed on the drive
+        since the last call, as reported by changes.list. The first call
+        only records where to start from. Returns the number of changes."""
+        token = self._changes_token
+        if token is None and self.cache:
+            token = self.cache.get_meta('changes_token')
+        if token is None:
+            try:
+                token = self.service.changes().getStartPageToken().execute(http=self.http)['startPageToken']
+            except HttpError as err:
+                raise GoogleDriveAPIError.from_http_error(err)
+            self._changes_token = token
+            if self.cache:
+                self.cache.put_meta('changes_token', token)
+            return 0
+
+        applied = 0
+        result = {'nextPageToken': token}
+        while 'nextPageToken' in result:
+            try:
+                result = self.service.changes().list(
+                        pageToken=result['nextPageToken'],
+                        pageSize=1000,
+                        spaces=spaces,
+                        fields="nextPageToken, newStartPageToken, changes(fileId, removed, file({}, trashed))".format(self.default_fields),
+                    ).execute(http=self.http)
+            except HttpError as err:
+                raise GoogleDriveAPIError.from_http_error(err)
+            for change in result.get('changes', []):
+                self._apply_change(change)
+                applied += 1
+        self._changes_token = result['newStartPageToken']
+        if self.cache:
+            self.cache.put_meta('changes_token', self._changes_token)
+        return applied
+
+    def _apply_change(self, change: dict):
+        id_ = change['fileId']
+        for key in self._name_keys.pop(id_, ()):
+            self._name_cache.pop(key, None)
+        if self.cache:
+            self.cache.delete_names_of(id_)
+            self.cache.delete_item(id_)
+        reply = change.get('file')
+        if change.get('removed') or not reply or reply.get('trashed'):
+            self._id_cache.pop(id_, None)
+            return
+        for parent_id in reply.get('parents', []):
+            # Another item cached under the new name isn't unique anymore
+            self._name_cache.pop('/'.join((parent_id, reply['name'])), None)
+            if self.cache:
+                self.cache.delete_name(parent_id, reply['name'])
+        self._forget_misses(reply.get('parents', []), reply['name'])
+        item = self._id_cache.get(id_)
+        if item is not None:
+            # Keep the object others may hold references to up to date
+            item.name = reply['name']
+            item.parent_ids = reply.get('parents', [])
+            item.__dict__.pop('_parent', None)
+            item._metadata.clear()
+
+    def cache_stats(self) -> dict:
+        """CacheStats of the in-memory caches that keep statistics, by
+        name"""
+        caches = {'id': self._id_cache, 'name': self._name_cache, 'miss': self._miss_cache}
+        return {name: cache.stats for name, cache in caches.items() if hasattr(cache, 'stats')}
+
+    def _profile_fields(self, profile=None, metadata=False) -> str:
+        if profile is None:
+            profile = 'metadata' if metadata else 'default'
+        try:
+            return self.field_profiles[profile]
+        except KeyError:
+            raise ValueError("Unknown field profile {}".format(profile))
+
+    def _cache_item(self, item: DriveItem, reply: dict = None):
+        self._id_cache[item.id] = item
+        self._forget_misses(item.parent_ids, item.name)
+        if self.cache and reply:
+            self.cache.put_item(self._structural(reply))
+
+    def _structural(self, reply: dict) -> dict:
+        # Content metadata like md5Checksum may change any time
+        fields = [field.strip() for field in self.default_fields.split(',')]
+        return {field: reply[field] for field in fields if field in reply}
+
+    def _cache_name(self, key, value):
+        """Add value, an item or a tuple of duplicates, to the name cache
+        under key ('parent id/name'), remembering the key by item id so
+        apply_changes() needn't search the cache"""
+        self._name_cache[key] = value
+        for item in (value if isinstance(value, tuple) else (value,)):
+            self._name_keys.setdefault(item.id, set()).add(key)
+        if len(self._name_keys) > 2 * len(self._name_cache) + 1000:
+            # Drop keys the name cache has evicted or expired since
+            self._name_keys = dict()
+            for key, value in self._name_cache.items():
+                for item in (value if isinstance(value, tuple) else (value,)):
+                    self._name_keys.setdefault(item.id, set()).add(key)
+
+    def _forget_misses(self, parent_ids, name):
+        """Drop cached misses of name after it was created or moved there"""
+        for parent_id in parent_ids:
+            self._miss_cache.pop('/'.join((parent_id, name)), None)
+
+    def _uncache(self, item: DriveItem):
+        """Forget item and its names after it was renamed, moved or deleted"""
+        self._id_cache.pop(item.id, None)
+        for parent_id in item.parent_ids:
+            self._name_cache.pop('/'.join((parent_id, item.name)), None)
+        if self.cache:
+            self.cache.delete_item(item.id)
+            for parent_id in item.parent_ids:
+                self.cache.delete_name(parent_id, item.name)
 
     def resolve(self) -> str:
         return '/'
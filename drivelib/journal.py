@@ -0,0 +1,146 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from drivelib.drive import DriveFile
+from drivelib.drive import CheckSumError
+from drivelib.transfer import TransferResult
+
+__all__ = ['UploadJournal', 'LocalFileChangedError']
+
+
+class LocalFileChangedError(CheckSumError):
+    """The local file of a journaled upload changed since it was started"""
+    pass
+
+
+class UploadJournal:
+    """SQLite journal of unfinished uploads. Every upload started through
+    upload() is recorded with its local file and target; after each chunk
+    the session state and confirmed offset are stored. After a crash,
+    resume_all() continues everything that is left, as long as the upload
+    sessions haven't expired (Google keeps them for one week).
+    A journal can be shared by the threads of a TransferManager."""
+    def __init__(self, path, max_age=timedelta(days=7)):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id INTEGER PRIMARY KEY,
+                    local_file TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    parent_id TEXT,
+                    name TEXT NOT NULL,
+                    file_id TEXT,
+                    spaces TEXT NOT NULL,
+                    resumable_state TEXT,
+                    options TEXT NOT NULL DEFAULT '{}',
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    started REAL NOT NULL
+                )""")
+
+    # Arguments of DriveFile.upload() that resume_all() uses again
+    resumed_options = ('multipart_threshold', 'use_mmap', 'keep_revision', 'prefetch')
+
+    def upload(self, remote_file: DriveFile, local_file, progress_handler=None, **kwargs):
+        """remote_file.upload(local_file, ...) with the upload recorded in
+        the journal until it has finished."""
+        options = {key: value for key, value in kwargs.items() if key in self.resumed_options}
+        entry = self._add(remote_file, local_file, options)
+        self._upload(entry, remote_file, local_file, progress_handler, **kwargs)
+
+    def pending(self) -> list:
+        """Local files of all uploads that haven't finished"""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT local_file FROM uploads ORDER BY id")]
+
+    def resume_all(self, drive, chunksize=None, progress_handler=None) -> list:
+        """Continue every unfinished upload. Uploads whose session has
+        expired, whose local file has changed or vanished, or whose target
+        is gone are dropped from the journal and reported as failed; other
+        failures, including a session that failed its checksum and starts
+        over, are kept for the next attempt. Returns one TransferResult per
+        journal entry."""
+        with self._lock:
+            rows = self._db.execute("""SELECT id, local_file, size, mtime_ns, parent_id, name, file_id,
+                                        spaces, resumable_state, options, started FROM uploads ORDER BY id""").fetchall()
+        results = []
+        for entry, local_file, size, mtime_ns, parent_id, name, file_id, spaces, state, options, started in rows:
+            # New revisions of files without a parent, e.g. shared with
+            # me, are identified by their id alone
+            remote_file = DriveFile(drive, [parent_id] if parent_id else [], name, file_id, spaces)
+            result = TransferResult(local_file, remote_file)
+            result.size = size
+            results.append(result)
+            try:
+                self._check_resumable(local_file, size, mtime_ns, started)
+            except (TimeoutError, LocalFileChangedError, FileNotFoundError) as err:
+                result.error = err
+                self._remove(entry)
+                continue
+            try:
+                self._upload(entry, remote_file, local_file, progress_handler, chunksize=chunksize,
+                                resumable_state=json.loads(state) if state else None, **json.loads(options))
+            except FileNotFoundError as err:
+                # The target or the session is gone (404)
+                result.error = err
+                self._remove(entry)
+            except Exception as err:
+                result.error = err
+        return results
+
+    def _check_resumable(self, local_file, size, mtime_ns, started):
+        if time.time() - started > self.max_age.total_seconds():
+            raise TimeoutError("Upload session of {} has expired".format(local_file))
+        local_stat = os.stat(local_file)
+        if (local_stat.st_size, local_stat.st_mtime_ns) != (size, mtime_ns):
+            raise LocalFileChangedError("{} has changed since the upload was started".format(local_file))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _upload(self, entry, remote_file, local_file, progress_handler=None, **kwargs):
+        def journal_progress(status):
+            self._update(entry, status)
+            if progress_handler:
+                progress_handler(status)
+        try:
+            remote_file.upload(local_file, progress_handler=journal_progress, **kwargs)
+        except CheckSumError:
+            # The session is unusable, a resume has to start from scratch
+            self._update(entry, None)
+            raise
+        self._remove(entry)
+
+    def _add(self, remote_file, local_file, options: dict) -> int:
+        local_file = os.path.abspath(local_file)
+        local_stat = os.stat(local_file)
+        with self._lock, self._db:
+            return self._db.execute("""INSERT INTO uploads (local_file, size, mtime_ns, parent_id, name, file_id, spaces,
+                                            options, started) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                    (local_file, local_stat.st_size, local_stat.st_mtime_ns,
+                                        remote_file.parent_ids[0] if remote_file.parent_ids else None,
+                                        remote_file.name, remote_file.id, remote_file.spaces, json.dumps(options),
+                                        time.time())).lastrowid
+
+    def _update(self, entry, status):
+        if status is not None and status.resumable_state is None:
+            # Uploaded in a single request, nothing to resume
+            return
+        state = json.dumps(status.resumable_state) if status else None
+        progress = status.resumable_progress if status else 0
+        with self._lock, self._db:
+            self._db.execute("UPDATE uploads SET resumable_state = ?, progress = ? WHERE id = ?",
+                                (state, progress, entry))
+
+    def _remove(self, entry):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM uploads WHERE id = ?", (entry,))
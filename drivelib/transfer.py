@@ -0,0 +1,161 @@
+import os
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from drivelib.drive import DriveFile
+
+__all__ = ['TransferManager', 'TransferResult', 'BatchProgress']
+
+
+class BatchProgress:
+    def __init__(self, transferred, total_size, files_done, files_total):
+        self.transferred = transferred
+        self.total_size = total_size
+        self.files_done = files_done
+        self.files_total = files_total
+
+    def progress(self) -> float:
+        if self.total_size:
+            return self.transferred / self.total_size
+        return 1.0 if self.files_done == self.files_total else 0.0
+
+    def __str__(self):
+        return "{}/{} ({:.0%}) {}/{} files".format(
+                                self.transferred,
+                                self.total_size,
+                                self.progress(),
+                                self.files_done,
+                                self.files_total
+                            )
+
+
+class TransferResult:
+    """Outcome of a single transfer of a batch. On failure `error` holds
+    the exception and remote_file keeps its resumable_uri, so the transfer
+    can be resumed by passing (local_file, remote_file) again."""
+    def __init__(self, local_file, remote_file: DriveFile):
+        self.local_file = local_file
+        self.remote_file = remote_file
+        self.size = 0
+        self.error = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return "<TransferResult {} -> {}: {}>".format(
+                                self.local_file,
+                                self.remote_file.name,
+                                self.error or "ok"
+                            )
+
+
+class _BatchTracker:
+    def __init__(self, results, progress_handler):
+        self._lock = threading.Lock()
+        self._progress_handler = progress_handler
+        self._transferred = dict()
+        self._total_size = sum(result.size for result in results)
+        self._files_total = len(results)
+        self._files_done = 0
+
+    def update(self, result, transferred):
+        with self._lock:
+            self._transferred[id(result)] = transferred
+            self._report()
+
+    def finished(self, result):
+        with self._lock:
+            if result.ok:
+                self._transferred[id(result)] = result.size
+            self._files_done += 1
+            self._report()
+
+    def _report(self):
+        if self._progress_handler:
+            self._progress_handler(BatchProgress(
+                                sum(self._transferred.values()),
+                                self._total_size,
+                                self._files_done,
+                                self._files_total
+                            ))
+
+
+class TransferManager:
+    """Runs many transfers on a bounded pool of worker threads.
+    progress_handler receives a BatchProgress for the whole batch and is
+    called from the worker threads, one call at a time. An exception
+    raised by it fails the transfer that triggered the call. use_mmap and
+    prefetch are passed on to DriveFile.upload(). With an UploadJournal, uploads are
+    recorded in it and can be resumed after a crash."""
+    def __init__(self, workers=4, chunksize=None, progress_handler=None, use_mmap=False, prefetch=0,
+                    journal=None):
+        self.workers = workers
+        self.chunksize = chunksize
+        self.progress_handler = progress_handler
+        self.use_mmap = use_mmap
+        self.prefetch = prefetch
+        self.journal = journal
+
+    def upload_many(self, uploads, ignore_existing=False) -> list:
+        """Upload every (local_file, target) pair of `uploads`. target is
+        either a DriveFolder, where the file keeps its local name, or a
+        DriveFile as returned by DriveFolder.new_file(). Existing names
+        are looked up once per target folder. Returns one TransferResult
+        per pair, in order; failures don't abort the batch."""
+        results = []
+        existing_names = dict()
+        for local_file, target in uploads:
+            if target.isfolder():
+                remote_file = DriveFile(target.drive, [target.id], os.path.basename(local_file), spaces=target.spaces)
+            else:
+                remote_file = target
+            result = TransferResult(local_file, remote_file)
+            results.append(result)
+            try:
+                result.size = os.path.getsize(local_file)
+            except OSError as err:
+                result.error = err
+                continue
+
+            if ignore_existing or remote_file.id:
+                continue
+            parent_id = remote_file.parent_ids[0]
+            if parent_id not in existing_names:
+                query = "'{}' in parents and trashed = false".format(parent_id)
+                existing_names[parent_id] = set(remote_file.drive.names_by_query(query, spaces=remote_file.spaces))
+            if remote_file.name in existing_names[parent_id]:
+                result.error = FileExistsError("Filename already exists ({name}).".format(name=remote_file.name))
+            else:
+                existing_names[parent_id].add(remote_file.name)
+
+        pending = [result for result in results if result.ok]
+        tracker = _BatchTracker(pending, self.progress_handler)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for result in pending:
+                executor.submit(self._upload, result, tracker)
+        return results
+
+    def _upload(self, result: TransferResult, tracker: _BatchTracker):
+        def progress_handler(status):
+            tracker.update(result, status.resumable_progress)
+        if self.journal:
+            upload = functools.partial(self.journal.upload, result.remote_file)
+        else:
+            upload = result.remote_file.upload
+        try:
+            upload(
+                    result.local_file,
+                    chunksize=self.chunksize,
+                    progress_handler=progress_handler,
+                    use_mmap=self.use_mmap,
+                    prefetch=self.prefetch
+                )
+        except Exception as err:
+            result.error = err
+        try:
+            tracker.finished(result)
+        except Exception as err:
+            result.error = result.error or err
@@ -58,6 +58,5 @@ setup(
         'google-auth-httplib2',
         'google-auth',
         'oauth2client',
-        'expiringdict',
       ],
 )
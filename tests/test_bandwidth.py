@@ -0,0 +1,81 @@
+import time
+import threading
+
+from drivelib import TokenBucket
+from drivelib import BandwidthLimiter
+
+
+class TestTokenBucket:
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        start = time.monotonic()
+        bucket.consume(10**12)
+        assert time.monotonic() - start < 0.1
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1000, burst=500)
+        start = time.monotonic()
+        bucket.consume(500)
+        assert time.monotonic() - start < 0.1
+        bucket.consume(100)
+        assert time.monotonic() - start >= 0.09
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=10000, burst=1000)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.consume(1000)
+        elapsed = time.monotonic() - start
+        assert 0.25 <= elapsed < 0.6
+
+    def test_shared_between_threads(self):
+        bucket = TokenBucket(rate=10000, burst=1)
+        def transfer():
+            for _ in range(2):
+                bucket.consume(500)
+        threads = [threading.Thread(target=transfer) for _ in range(3)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - start >= 0.28
+
+    def test_reconfigure_wakes_waiting(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.consume(1)
+        thread = threading.Thread(target=bucket.consume, args=(100,))
+        thread.start()
+        time.sleep(0.05)
+        bucket.configure(None)
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+
+class TestBandwidthLimiter:
+    def test_separate_budgets(self):
+        limiter = BandwidthLimiter(upload=1000, upload_burst=1000)
+        start = time.monotonic()
+        limiter.download.consume(10**9)
+        limiter.upload.consume(1000)
+        assert time.monotonic() - start < 0.1
+        limiter.configure(upload=None, download=1000)
+        assert limiter.upload.rate is None
+        assert limiter.download.rate == 1000
+
+    def test_configure_one_direction(self):
+        limiter = BandwidthLimiter(upload=1000)
+        limiter.configure(download=2000)
+        assert limiter.upload.rate == 1000
+        assert limiter.download.rate == 2000
+        limiter.configure(upload_burst=5000)
+        assert limiter.upload.rate == 1000
+        assert limiter.upload.burst == 5000
+        assert limiter.download.rate == 2000
+
+    def test_configure_keeps_burst(self):
+        limiter = BandwidthLimiter(upload=1000, upload_burst=50000, download=1000)
+        limiter.configure(upload=2000, download=3000)
+        assert limiter.upload.rate == 2000
+        assert limiter.upload.burst == 50000
+        # Without an explicit burst it stays one second worth of tokens
+        assert limiter.download.burst == 3000
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+import pytest
+
+from drivelib import PersistentCache, LRUCache
+
+
+class TestPersistentCache:
+    def test_items(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"))
+        reply = {'id': 'abc', 'name': 'file', 'parents': ['root']}
+        cache.put_item(reply)
+        cache.put_item(reply, 'alias')
+        assert cache.get_item('abc') == reply
+        assert cache.get_item('alias') == reply
+        cache.delete_item('abc')
+        assert cache.get_item('abc') is None
+
+    def test_names(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"))
+        cache.put_name('parent', 'file', 'abc')
+        assert cache.get_name('parent', 'file') == 'abc'
+        assert cache.get_name('other', 'file') is None
+        cache.delete_name('parent', 'file')
+        assert cache.get_name('parent', 'file') is None
+
+    def test_listing(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"), max_len=10)
+        replies = [{'id': str(i), 'name': 'file{}'.format(i), 'parents': ['parent']} for i in range(200)]
+        cache.put_items(replies)
+        cache.put_names('parent', {reply['name']: reply['id'] for reply in replies})
+        assert cache.get_item('199') == replies[199]
+        assert cache.get_name('parent', 'file199') == '199'
+        # Pruned once the listing is written
+        assert cache.get_name('parent', 'file0') is None
+        cache.delete_names('parent', ['file198', 'file199'])
+        assert cache.get_name('parent', 'file199') is None
+
+    def test_name_max_age(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"))
+        cache.put_name('parent', 'file', 'abc')
+        assert cache.get_name('parent', 'file', max_age=timedelta(minutes=1)) == 'abc'
+        assert cache.get_name('parent', 'file', max_age=timedelta(0)) is None
+        cache.put_item({'id': 'abc'})
+        assert cache.get_item('abc') is not None
+
+    def test_shared_between_instances(self, tmp_path):
+        first = PersistentCache(str(tmp_path / "cache.sqlite"))
+        second = PersistentCache(str(tmp_path / "cache.sqlite"))
+        first.put_name('parent', 'file', 'abc')
+        assert second.get_name('parent', 'file') == 'abc'
+
+    def test_max_age(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"), max_age=timedelta(0))
+        cache.put_name('parent', 'file', 'abc')
+        assert cache.get_name('parent', 'file') is None
+
+    def test_max_len(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"), max_len=10)
+        for i in range(200):
+            cache.put_name('parent', str(i), str(i))
+        assert cache.get_name('parent', '199') == '199'
+        assert cache.get_name('parent', '0') is None
+
+    def test_delete_names_of(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"))
+        cache.put_name('parent', 'file', 'abc')
+        cache.put_name('other', 'link', 'abc')
+        cache.put_name('parent', 'keep', 'def')
+        cache.delete_names_of('abc')
+        assert cache.get_name('parent', 'file') is None
+        assert cache.get_name('other', 'link') is None
+        assert cache.get_name('parent', 'keep') == 'def'
+
+    def test_meta(self, tmp_path):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite"))
+        assert cache.get_meta('changes_token') is None
+        cache.put_meta('changes_token', '42')
+        assert cache.get_meta('changes_token') == '42'
+
+
+class TestLRUCache:
+    def test_lru_order(self):
+        cache = LRUCache(max_len=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        assert cache['a'] == 1
+        cache['c'] = 3
+        assert 'b' not in cache
+        assert cache.get('a') == 1 and cache.get('c') == 3
+        assert cache.stats.evictions == 1
+
+    def test_max_bytes(self):
+        cache = LRUCache(max_len=None, max_bytes=1000, sizeof=lambda value: 300)
+        for i in range(10):
+            cache[str(i)] = i
+        assert 0 < len(cache) <= 3
+        assert cache.stats.bytes <= 1000
+        assert cache.stats.evictions == 10 - len(cache)
+        assert '9' in cache and '0' not in cache
+
+    def test_max_age(self):
+        cache = LRUCache(max_age=timedelta(0))
+        cache['a'] = 1
+        assert cache.get('a') is None
+        assert cache.stats.expirations == 1
+
+    def test_stats(self):
+        cache = LRUCache()
+        cache['a'] = 1
+        cache.get('a')
+        cache.get('b')
+        with pytest.raises(KeyError):
+            cache['c']
+        assert 'a' in cache
+        stats = cache.stats
+        assert (stats.hits, stats.misses, stats.entries) == (1, 2, 1)
+
+    def test_change_while_iterating(self):
+        cache = LRUCache()
+        for i in range(5):
+            cache[i] = i
+        for key, value in cache.items():
+            cache.pop(key)
+        assert len(cache) == 0 and cache.stats.bytes == 0
+        assert cache.pop('missing', None) is None
@@ -2,17 +2,26 @@ import pytest
 import string
 import random
 import os
+import json
 from pathlib import Path
 import shutil
 from hashlib import md5
+from datetime import timedelta
 
 from drivelib import Credentials
 from drivelib import GoogleDrive
 from drivelib import DriveFile
 from drivelib import DriveFolder
 from drivelib import ResumableMediaUploadProgress
+from drivelib import AdaptiveChunksize
+from drivelib import TransferManager
+from drivelib import PersistentCache
+from drivelib import UploadJournal
+from drivelib import LocalFileChangedError
 from drivelib import InvalidUrlError
 from drivelib import AmbiguousPathError
+from drivelib.drive import _StreamMedia
+from drivelib.drive import _PrefetchMedia
 from drivelib.errors import BackendError
 
 from drivelib import CheckSumError
@@ -148,6 +157,91 @@ class TestGoogleDrive:
     def test_id_cache(self):
         raise NotImplementedError
 
+    def test_cache_settings(self, gdrive: GoogleDrive):
+        drive = GoogleDrive(gdrive.json_creds(), id_cache_size=5000, name_cache_max_bytes=10**6,
+                                miss_cache_ttl=1)
+        assert drive._id_cache.max_len == 5000
+        assert drive._name_cache.max_len == 1000
+        assert drive._name_cache.max_bytes == 10**6
+        assert drive._miss_cache.max_age == timedelta(seconds=1)
+        assert drive._id_cache.max_age is None
+        assert set(drive.cache_stats()) == {'id', 'name', 'miss'}
+
+    def test_apply_changes(self, gdrive: GoogleDrive, remote_tmpdir: DriveFolder):
+        with open(token_file) as fh:
+            other_process = GoogleDrive(fh.read())
+        drive = GoogleDrive(gdrive.json_creds(), name_cache_ttl=float('inf'))
+        drive.apply_changes()
+        folder = drive.item_by_id(remote_tmpdir.id)
+        remote_file = folder.new_file(random_string())
+        remote_file.upload_empty()
+        cached = folder.child(remote_file.name)
+
+        new_name = random_string()
+        other_process.item_by_id(remote_file.id).rename(new_name)
+        assert drive.apply_changes() >= 1
+        assert cached.name == new_name
+        with pytest.raises(FileNotFoundError):
+            folder.child(remote_file.name)
+        assert folder.child(new_name) == remote_file
+
+        # A duplicate created elsewhere makes the cached name ambiguous
+        other_folder = other_process.item_by_id(remote_tmpdir.id)
+        other_folder.new_file(new_name, ignore_existing=True).upload_empty()
+        assert drive.apply_changes() >= 1
+        with pytest.raises(AmbiguousPathError):
+            folder.child(new_name)
+
+    def test_persistent_cache(self, gdrive: GoogleDrive, remote_tmpdir: DriveFolder, tmp_path: Path, monkeypatch):
+        cache_file = str(tmp_path / "cache.sqlite")
+        subdir = remote_tmpdir.mkdir(random_string())
+        remote_file = subdir.new_file(random_string())
+        remote_file.upload_empty()
+        path = "/".join((remote_tmpdir_prefix, subdir.name, remote_file.name))
+        assert GoogleDrive(gdrive.json_creds(), cache=PersistentCache(cache_file)).child_from_path(path) == remote_file
+
+        # A new instance resolves the path without listing a folder
+        drive = GoogleDrive(gdrive.json_creds(), cache=PersistentCache(cache_file))
+        def no_listing(*args, **kwargs):
+            raise AssertionError("Path not resolved from the cache")
+        monkeypatch.setattr(drive, "items_by_query", no_listing)
+        assert drive.child_from_path(path) == remote_file
+        monkeypatch.undo()
+
+        # Renamed and moved through an instance sharing the cache
+        new_name = random_string()
+        drive.child_from_path(path).rename(new_name)
+        other = GoogleDrive(gdrive.json_creds(), cache=PersistentCache(cache_file))
+        with pytest.raises(FileNotFoundError):
+            other.child_from_path(path)
+        moved_path = "/".join((remote_tmpdir_prefix, new_name))
+        other.child_from_path("/".join((remote_tmpdir_prefix, subdir.name, new_name))).move(other.child(remote_tmpdir_prefix))
+        assert GoogleDrive(gdrive.json_creds(), cache=PersistentCache(cache_file)).child_from_path(moved_path) == remote_file
+
+        # Renamed by a process without the cache: names are trusted for name_cache_ttl only
+        gdrive.item_by_id(remote_file.id).rename(random_string())
+        fresh = GoogleDrive(gdrive.json_creds(), cache=PersistentCache(cache_file), name_cache_ttl=0)
+        with pytest.raises(FileNotFoundError):
+            fresh.child_from_path(moved_path)
+
+    def test_snapshot(self, gdrive: GoogleDrive, remote_tmpdir: DriveFolder):
+        subdir = remote_tmpdir.mkdir(random_string())
+        remote_file = subdir.new_file(random_string())
+        remote_file.upload_empty()
+
+        cached = gdrive.item_by_id(remote_file.id)
+        snapshot = gdrive.snapshot()
+        path = snapshot.resolve(remote_file)
+        assert path == "/".join((remote_tmpdir.resolve(), subdir.name, remote_file.name))
+        assert snapshot.child_from_path(path) == remote_file
+        assert snapshot.child(subdir, remote_file.name) == remote_file
+        assert list(snapshot.children(subdir)) == [remote_file]
+        top, folders, files = next(snapshot.walk(subdir))
+        assert top == snapshot.resolve(subdir)
+        assert folders == [] and files == [remote_file]
+        # Snapshot items don't replace the cached ones
+        assert gdrive.item_by_id(remote_file.id) is cached
+
 class TestDriveItem:
     def test_rename_flat(self, remote_tmpdir: DriveFolder):
         remote_file = remote_tmpdir.new_file(random_string())
@@ -242,6 +336,22 @@ class TestDriveFolder:
         file_.upload_empty()
         assert file_ == remote_tmpdir.child(filename)
 
+    def test_child_miss_cache(self, remote_tmpdir: DriveFolder):
+        name = random_string()
+        with pytest.raises(FileNotFoundError):
+            remote_tmpdir.child(name)
+        assert '/'.join((remote_tmpdir.id, name)) in remote_tmpdir.drive._miss_cache
+        folder = remote_tmpdir.mkdir(name)
+        assert folder == remote_tmpdir.child(name)
+
+        other_file = remote_tmpdir.new_file(random_string())
+        other_file.upload_empty()
+        new_name = random_string()
+        with pytest.raises(FileNotFoundError):
+            remote_tmpdir.child(new_name)
+        other_file.rename(new_name)
+        assert other_file == remote_tmpdir.child(new_name)
+
     def test_child_duplicate(self, remote_tmpdir: DriveFolder):
         filename = random_string()
         remote_tmpdir.new_file(filename).upload_empty()
@@ -262,6 +372,32 @@ class TestDriveFolder:
 
         assert created_files == listed_files
 
+    def test_children_name_cache(self, remote_tmpdir: DriveFolder):
+        unique = remote_tmpdir.new_file(random_string())
+        unique.upload_empty()
+        duplicate = random_string()
+        remote_tmpdir.new_file(duplicate).upload_empty()
+        remote_tmpdir.new_file(duplicate, ignore_existing=True).upload_empty()
+        remote_tmpdir.drive._name_cache.clear()
+
+        list(remote_tmpdir.children())
+        assert remote_tmpdir._get_from_name_cache(unique.name) == unique
+        assert len(remote_tmpdir._get_from_name_cache(duplicate)) == 2
+        with pytest.raises(AmbiguousPathError):
+            remote_tmpdir.child(duplicate)
+
+    def test_children_profile(self, remote_tmpdir: DriveFolder, remote_tmpfile):
+        remote_file = remote_tmpfile(size_bytes=700)
+        shortcut = remote_file.create_shortcut(random_string(), parent=remote_tmpdir)
+
+        listed = {item.name: item for item in remote_tmpdir.children(profile='minimal')}
+        assert listed[shortcut.name].isshortcut()
+        assert listed[shortcut.name].target == remote_file
+        listed = {item.name: item for item in remote_tmpdir.children(profile='metadata')}
+        assert listed[remote_file.name]._metadata['size'] == '700'
+        with pytest.raises(ValueError):
+            list(remote_tmpdir.children(profile='doesnotexist'))
+
     def test_children_onlyfolders(self, remote_tmpdir: DriveFolder):
         remote_folder = remote_tmpdir.mkdir(random_string())
         remote_file = remote_tmpdir.new_file(random_string())
@@ -392,6 +528,33 @@ class TestDriveFile:
         remote_file.download(str(local_file), chunksize=chunksize, progress_handler=progress.update_status)
         assert progress.chunks_since_last_abort == 1
 
+    def test_download_pipelined(self, tmpfile: Path, remote_tmpfile: DriveFile):
+        chunksize = chunksize_min
+        remote_file = remote_tmpfile(size_bytes=chunksize*4+1)
+        local_file = tmpfile(filename=remote_file.name)
+        progress = ProgressExtractor(abort_at=0.5)
+        with pytest.raises(AbortTransfer):
+            remote_file.download(str(local_file), chunksize=chunksize, pipeline=2, progress_handler=progress.update_status)
+        progress.abort_at = 1
+        remote_file.download(str(local_file), chunksize=chunksize, pipeline=2, progress_handler=progress.update_status)
+        assert progress.status.resumable_progress == chunksize*4+1
+        assert md5_file(local_file) == remote_file.md5sum
+
+    def test_download_resume_corrupted_tail(self, tmpfile: Path, remote_tmpfile: DriveFile):
+        chunksize = chunksize_min
+        remote_file = remote_tmpfile(size_bytes=chunksize*3)
+        local_file = tmpfile(filename=remote_file.name)
+        progress = ProgressExtractor(abort_at=0.5)
+        with pytest.raises(AbortTransfer):
+            remote_file.download(str(local_file), chunksize=chunksize, progress_handler=progress.update_status)
+        with local_file.open('r+b') as fh:
+            fh.seek(chunksize+1)
+            fh.write(b'\0')
+        progress.abort_at = 1
+        remote_file.download(str(local_file), chunksize=chunksize, progress_handler=progress.update_status)
+        assert progress.chunks_since_last_abort == 2
+        assert md5_file(local_file) == remote_file.md5sum
+
     def test_download_local_file_does_not_match(self, tmpfile: Path, remote_tmpfile: DriveFile):
         chunksize = chunksize_min
         remote_file = remote_tmpfile(size_bytes=chunksize*2)
@@ -411,6 +574,70 @@ class TestDriveFile:
         remote_file.download(str(local_file), chunksize=chunksize)
         assert md5_file(local_file) == remote_file.md5sum
 
+    def test_download_parallel(self, tmpfile: Path, remote_tmpfile: DriveFile):
+        chunksize = chunksize_min
+        remote_file = remote_tmpfile(size_bytes=chunksize*5+100)
+        local_file = tmpfile()
+        remote_file.download(str(local_file), chunksize=chunksize, parallel=3)
+        assert md5_file(local_file) == remote_file.md5sum
+        assert not os.path.exists(str(local_file)+".drivelib")
+
+    def test_download_parallel_resume(self, tmpfile: Path, remote_tmpfile: DriveFile):
+        chunksize = chunksize_min
+        remote_file = remote_tmpfile(size_bytes=chunksize*4)
+        local_file = tmpfile(filename=remote_file.name)
+        progress = ProgressExtractor(abort_at=0.0)
+        with pytest.raises(AbortTransfer):
+            remote_file.download(str(local_file), chunksize=chunksize, parallel=2, progress_handler=progress.update_status)
+        assert os.path.exists(str(local_file)+".drivelib")
+        progress.abort_at = 1
+        remote_file.download(str(local_file), chunksize=chunksize, progress_handler=progress.update_status)
+        assert progress.status.resumable_progress == chunksize*4
+        assert md5_file(local_file) == remote_file.md5sum
+
+    def test_download_into(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        local_file = tmpfile(size_bytes=chunksize_min*2+10)
+        content = local_file.read_bytes()
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        remote_file.upload(str(local_file))
+
+        buffer = bytearray(len(content))
+        assert remote_file.download_into(buffer, chunksize=chunksize_min) == len(content)
+        assert buffer == content
+
+        dl_file = tmpfile()
+        with dl_file.open('wb') as fh:
+            remote_file.download_into(fh)
+        assert md5_file(dl_file) == remote_file.md5sum
+
+        with pytest.raises(ValueError):
+            remote_file.download_into(bytearray(10))
+
+        buffer = bytearray(10)
+        assert remote_file.readinto(buffer, offset=100) == 10
+        assert buffer == content[100:110]
+
+    def test_open(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        local_file = tmpfile(size_bytes=chunksize_min*3)
+        content = local_file.read_bytes()
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        remote_file.upload(str(local_file))
+
+        with remote_file.open('rb', buffering=chunksize_min) as fh:
+            assert fh.read(100) == content[:100]
+            fh.seek(-100, os.SEEK_END)
+            assert fh.read() == content[-100:]
+            fh.seek(chunksize_min)
+            assert fh.read(10) == content[chunksize_min:chunksize_min+10]
+            assert fh.tell() == chunksize_min+10
+            fh.seek(0)
+            assert fh.read() == content
+
+        with pytest.raises(ValueError):
+            remote_file.open('wb')
+        with pytest.raises(ValueError):
+            remote_file.open('r')
+
     def test_upload(self, tmpfile: Path, remote_tmpdir: DriveFolder):
         # No chunksize specified
         local_file = tmpfile(size_bytes = 1024)
@@ -436,6 +663,93 @@ class TestDriveFile:
         with pytest.raises(FileNotFoundError):
             remote_file.upload(str(local_file))
 
+    def test_upload_multipart(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        local_file = tmpfile(size_bytes=chunksize_min)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        progress = ProgressExtractor(abort_at=1)
+        remote_file.upload(str(local_file), chunksize=chunksize_min, progress_handler=progress.update_status)
+        assert progress.chunks == 1
+        assert progress.status.resumable_uri == None
+        assert remote_file.md5sum == md5_file(local_file)
+
+        # Files above the threshold use a resumable session
+        remote_file = remote_tmpdir.new_file(random_string())
+        progress = ProgressExtractor(abort_at=0.0)
+        with pytest.raises(AbortTransfer):
+            remote_file.upload(str(local_file), multipart_threshold=0, progress_handler=progress.update_status)
+        assert progress.status.resumable_uri
+
+    def test_upload_mmap(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*3+1)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        progress = ProgressExtractor(abort_at=0.3)
+        with pytest.raises(AbortTransfer):
+            remote_file.upload(str(local_file), chunksize=chunksize, use_mmap=True,
+                                progress_handler=progress.update_status)
+        progress.abort_at = 1
+        remote_file.upload(str(local_file), chunksize=chunksize, use_mmap=True,
+                                progress_handler=progress.update_status)
+        assert progress.chunks_since_last_abort == 3
+        assert remote_file.md5sum == md5_file(local_file)
+
+    def test_upload_prefetch(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*5+1)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        progress = ProgressExtractor(abort_at=0.3)
+        with pytest.raises(AbortTransfer):
+            remote_file.upload(str(local_file), chunksize=chunksize, prefetch=chunksize*3,
+                                progress_handler=progress.update_status)
+        progress.abort_at = 1
+        remote_file.upload(str(local_file), chunksize=chunksize, prefetch=chunksize*3,
+                                progress_handler=progress.update_status)
+        assert progress.chunks_since_last_abort == 4
+        assert remote_file.md5sum == md5_file(local_file)
+
+    def test_upload_stream(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*2+1)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        progress = ProgressExtractor(abort_at=1)
+        with local_file.open('rb') as fh:
+            remote_file.upload_stream(fh, chunksize=chunksize, progress_handler=progress.update_status)
+        assert progress.chunks == 3
+        assert remote_file.md5sum == md5_file(local_file)
+
+    def test_upload_stream_iterator(self, remote_tmpdir: DriveFolder):
+        chunks = [os.urandom(1000) for _ in range(300)]
+        remote_file = remote_tmpdir.new_file(random_string())
+        remote_file.upload_stream(iter(chunks), chunksize=chunksize_min)
+        assert remote_file.md5sum == md5(b''.join(chunks)).hexdigest()
+
+        remote_file = remote_tmpdir.new_file(random_string())
+        remote_file.upload_stream(iter([]))
+        assert remote_file.size == 0
+
+        # Compressors yield empty chunks before a flush
+        remote_file = remote_tmpdir.new_file(random_string())
+        remote_file.upload_stream(iter([chunks[0], b'', chunks[1]]))
+        assert remote_file.md5sum == md5(chunks[0] + chunks[1]).hexdigest()
+
+    def test_stream_media_empty_items(self):
+        media = _StreamMedia(iter([b'a'*10, b'', b'b'*10]))
+        assert media.getbytes(0, chunksize_min) == b'a'*10 + b'b'*10
+        assert media.size() == 20
+
+    def test_prefetch_media_memory(self, tmpfile: Path):
+        local_file = tmpfile(size_bytes=chunksize_min*24)
+        media = _PrefetchMedia(str(local_file), chunksize_min, memory=chunksize_min*4)
+        data = local_file.read_bytes()
+        begin = 0
+        # Chunks growing like with an AdaptiveChunksize
+        for length in (1, 2, 4, 8, 8, 8):
+            length = min(chunksize_min*length, media.max_chunksize())
+            assert bytes(media.getbytes(begin, length)) == data[begin:begin+length]
+            assert media._allocated <= chunksize_min*4
+            begin += length
+        media.close()
+
     def test_upload_progress_resume(self, tmpfile: Path, remote_tmpdir: DriveFolder):
         chunksize = chunksize_min
         local_file = tmpfile(size_bytes=chunksize*5)
@@ -489,6 +803,35 @@ class TestDriveFile:
             remote_file.upload(str(local_file_same_size), chunksize=chunksize)
         assert remote_file.resumable_uri == None
         
+    def test_adaptive_chunksize(self):
+        chunksize = AdaptiveChunksize(initial=chunksize_min, maximum=chunksize_min*8, target_duration=1)
+        chunksize.update(chunksize_min, 0.1)
+        assert chunksize.chunksize == chunksize_min*2
+        chunksize.update(chunksize_min*2, 0.01)
+        chunksize.update(chunksize_min*4, 0.01)
+        chunksize.update(chunksize_min*8, 0.01)
+        assert chunksize.chunksize == chunksize_min*8
+        chunksize.failed()
+        assert chunksize.chunksize == chunksize_min*4
+        chunksize.update(chunksize_min*4, 100)
+        assert chunksize.chunksize == chunksize_min*2
+        chunksize.update(chunksize_min+1, 1)
+        assert chunksize.aligned(chunksize_min) == chunksize_min
+
+    def test_transfer_adaptive_chunksize(self, tmpfile: Path, remote_tmpdir: DriveFolder):
+        local_file = tmpfile(size_bytes=chunksize_min*6+10)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        chunksize = AdaptiveChunksize(initial=chunksize_min)
+        progress = ProgressExtractor(abort_at=1)
+        remote_file.upload(str(local_file), chunksize=chunksize, progress_handler=progress.update_status)
+        assert progress.status.chunksize % chunksize_min == 0
+        assert md5_file(local_file) == remote_file.md5sum
+
+        dl_file = tmpfile()
+        remote_file.download(str(dl_file), chunksize=chunksize, progress_handler=progress.update_status)
+        assert progress.status.chunksize == chunksize.chunksize
+        assert md5_file(dl_file) == remote_file.md5sum
+
     def test_upload_chunksize_too_small(self, tmpfile: Path, remote_tmpdir: DriveFolder):
         chunksize = 1
         local_file = tmpfile(size_bytes=chunksize*2)
@@ -519,9 +862,32 @@ class TestDriveFile:
         local_file = tmpfile(size_bytes=1024)
         remote_file = remote_tmpfile(size_bytes=1024)
         id_pre_upload = remote_file.id
-        with pytest.raises(FileExistsError):
-            remote_file.upload(str(local_file))
+        remote_file.upload(str(local_file))
         assert remote_file.id == id_pre_upload
+        assert remote_file.md5sum == md5_file(local_file)
+
+    def test_upload_new_revision_resume(self, tmpfile: Path, remote_tmpfile: DriveFile):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*3)
+        remote_file = remote_tmpfile(size_bytes=1024)
+        id_pre_upload = remote_file.id
+        service = remote_file.drive.service
+        old_revision = service.files().get(fileId=remote_file.id, fields='headRevisionId').execute()['headRevisionId']
+        progress = ProgressExtractor(abort_at=0.3)
+        with pytest.raises(AbortTransfer):
+            remote_file.upload(str(local_file), chunksize=chunksize, keep_revision=True,
+                                progress_handler=progress.update_status)
+        progress.abort_at = 1
+        remote_file.upload(str(local_file), chunksize=chunksize, keep_revision=True,
+                                progress_handler=progress.update_status)
+        assert progress.chunks_since_last_abort == 2
+        assert remote_file.id == id_pre_upload
+        assert remote_file.size == chunksize*3
+        assert remote_file.md5sum == md5_file(local_file)
+        revision = service.revisions().get(fileId=remote_file.id, revisionId=old_revision, fields='keepForever').execute()
+        assert revision['keepForever'] is True
+        head = service.files().get(fileId=remote_file.id, fields='headRevisionId').execute()['headRevisionId']
+        assert head != old_revision
 
     @pytest.mark.xfail
     def test_upload_parallel_same_filename(self, tmpfile: Path, remote_tmpdir: DriveFolder):
@@ -585,6 +951,29 @@ class TestDriveFile:
                             resumable_uri=progress.status.resumable_uri
                         )
 
+    def test_upload_resume_with_stored_state(self, tmpfile: Path,
+                                            remote_tmpdir: DriveFolder):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*3)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        progress = ProgressExtractor(abort_at=0.5)
+        with pytest.raises(AbortTransfer):
+            remote_file.upload(
+                                str(local_file),
+                                chunksize=chunksize,
+                                progress_handler=progress.update_status
+                            )
+        state = json.loads(json.dumps(progress.status.resumable_state))
+        assert state['checkpoints'][-1][0] == progress.status.resumable_progress
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        remote_file.upload(
+                            str(local_file),
+                            chunksize=chunksize,
+                            resumable_state=state
+                        )
+        assert remote_file.resumable_state == None
+        assert remote_file.md5sum == md5_file(local_file)
+
     def test_copy(self, remote_tmpfile: DriveFile, remote_tmp_subdir: DriveFolder):
         remote_file = remote_tmpfile(size_bytes=1000)
 
@@ -613,6 +1002,103 @@ class TestDriveFile:
         assert copy.parent == remote_tmp_subdir
         
 
+class TestTransferManager:
+    def test_upload_many(self, tmpfile: Path, remote_tmp_subdir: DriveFolder):
+        local_files = [tmpfile(size_bytes=size) for size in (0, 1000, chunksize_min*2)]
+        existing = local_files[1]
+        remote_tmp_subdir.new_file(existing.name).upload_empty()
+        missing = tmpfile()
+
+        progress = []
+        manager = TransferManager(workers=2, chunksize=chunksize_min, progress_handler=progress.append)
+        uploads = [(str(local_file), remote_tmp_subdir) for local_file in local_files + [missing]]
+        results = manager.upload_many(uploads)
+
+        assert [result.ok for result in results] == [True, False, True, False]
+        assert isinstance(results[1].error, FileExistsError)
+        assert isinstance(results[3].error, FileNotFoundError)
+        for result in (results[0], results[2]):
+            assert remote_tmp_subdir.child(result.remote_file.name) == result.remote_file
+            assert result.remote_file.md5sum == md5_file(result.local_file)
+        assert progress[-1].files_done == progress[-1].files_total == 2
+        assert progress[-1].transferred == chunksize_min*2
+
+class TestUploadJournal:
+    def test_resume_all(self, gdrive: GoogleDrive, tmpfile: Path, tmp_path: Path, remote_tmpdir: DriveFolder):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*4)
+        journal = UploadJournal(str(tmp_path / "journal.sqlite"))
+        progress = ProgressExtractor(abort_at=0.4)
+        with pytest.raises(AbortTransfer):
+            journal.upload(remote_tmpdir.new_file(local_file.name), str(local_file),
+                            chunksize=chunksize, progress_handler=progress.update_status)
+        assert journal.pending() == [str(local_file)]
+        journal.close()
+
+        journal = UploadJournal(str(tmp_path / "journal.sqlite"))
+        progress.abort_at = 1
+        results = journal.resume_all(gdrive, chunksize=chunksize, progress_handler=progress.update_status)
+        assert [result.ok for result in results] == [True]
+        assert progress.chunks_since_last_abort == 2
+        assert journal.pending() == []
+        assert remote_tmpdir.child(local_file.name).md5sum == md5_file(local_file)
+
+    def test_resume_all_expired(self, gdrive: GoogleDrive, tmpfile: Path, tmp_path: Path, remote_tmpdir: DriveFolder):
+        local_file = tmpfile(size_bytes=chunksize_min*2)
+        journal = UploadJournal(str(tmp_path / "journal.sqlite"), max_age=timedelta(0))
+        progress = ProgressExtractor(abort_at=0.0)
+        with pytest.raises(AbortTransfer):
+            journal.upload(remote_tmpdir.new_file(local_file.name), str(local_file),
+                            chunksize=chunksize_min, progress_handler=progress.update_status)
+        results = journal.resume_all(gdrive)
+        assert isinstance(results[0].error, TimeoutError)
+        assert journal.pending() == []
+
+    def test_resume_all_keeps_entry(self, tmpfile: Path, tmp_path: Path, monkeypatch):
+        local_file = tmpfile(size_bytes=10)
+        journal = UploadJournal(str(tmp_path / "journal.sqlite"))
+        errors = [AbortTransfer(), CheckSumError("session"), TimeoutError("socket")]
+        def failing_upload(self, local_file, **kwargs):
+            raise errors.pop(0)
+        monkeypatch.setattr(DriveFile, "upload", failing_upload)
+        with pytest.raises(AbortTransfer):
+            journal.upload(DriveFile(None, ['parent'], local_file.name), str(local_file))
+        # Failures of the upload itself are retried next time
+        for _ in range(2):
+            results = journal.resume_all(None)
+            assert not results[0].ok
+            assert journal.pending() == [str(local_file)]
+        os.utime(str(local_file), ns=(0, 0))
+        results = journal.resume_all(None)
+        assert isinstance(results[0].error, LocalFileChangedError)
+        assert journal.pending() == []
+
+    def test_resume_all_options(self, gdrive: GoogleDrive, tmpfile: Path, tmp_path: Path, remote_tmpfile, monkeypatch):
+        chunksize = chunksize_min
+        local_file = tmpfile(size_bytes=chunksize*4)
+        remote_file = remote_tmpfile(size_bytes=1024)
+        # Like a file shared with me, a new revision needs no parent
+        remote_file.parent_ids = []
+        journal = UploadJournal(str(tmp_path / "journal.sqlite"))
+        progress = ProgressExtractor(abort_at=0.4)
+        with pytest.raises(AbortTransfer):
+            journal.upload(remote_file, str(local_file), chunksize=chunksize, use_mmap=True,
+                            keep_revision=True, progress_handler=progress.update_status)
+
+        upload = DriveFile.upload
+        used = dict()
+        def recording_upload(self, local_file, **kwargs):
+            used.update(kwargs)
+            return upload(self, local_file, **kwargs)
+        monkeypatch.setattr(DriveFile, "upload", recording_upload)
+        journal.close()
+        journal = UploadJournal(str(tmp_path / "journal.sqlite"))
+        progress.abort_at = 1
+        results = journal.resume_all(gdrive, chunksize=chunksize, progress_handler=progress.update_status)
+        assert [result.ok for result in results] == [True]
+        assert used['use_mmap'] is True and used['keep_revision'] is True
+        assert gdrive.item_by_id(remote_file.id).md5sum == md5_file(local_file)
+
 class TestDriveShortcuts:
     def test_shortcut_to_file(self, remote_tmpfile: DriveFile, remote_tmp_subdir: DriveFolder):
         remote_file = remote_tmpfile()
@@ -651,9 +1137,9 @@ class TestDriveShortcuts:
         local_file = tmpfile(size_bytes=500)
         remote_file = remote_tmpfile()
         shortcut = remote_file.create_shortcut(random_string())
-        # this behaviour will change once versioning is implemented
-        with pytest.raises(FileExistsError):
-            shortcut.upload(local_file)
+        shortcut.upload(local_file)
+        assert shortcut.target.id == remote_file.id
+        assert shortcut.md5sum == md5_file(local_file)
 
     def test_shortcut_mkdir(self, remote_tmp_subdir: DriveFolder):
         shortcut = remote_tmp_subdir.create_shortcut(random_string())
@@ -726,6 +1212,31 @@ class TestMetadata:
         remote_file.meta_set(metadata)
         assert remote_file.meta_get("description, starred") == metadata
 
+    def test_metadata_cache(self, remote_tmpfile: DriveFile, monkeypatch):
+        remote_file = remote_tmpfile(size_bytes=700)
+        requested = []
+        service = remote_file.drive.service
+        real_files = service.files
+        def files():
+            resource = real_files()
+            real_get = resource.get
+            def get(**kwargs):
+                requested.append(kwargs['fields'])
+                return real_get(**kwargs)
+            resource.get = get
+            return resource
+        monkeypatch.setattr(service, "files", files)
+
+        remote_file._metadata.clear()
+        assert remote_file.meta_get("size, starred") == {'size': '700', 'starred': False}
+        assert remote_file.meta_get("starred, trashed, size") == {'size': '700', 'starred': False, 'trashed': False}
+        assert remote_file.meta_get("size") == {'size': '700'}
+        assert requested == ["size, starred", "trashed"]
+
+        remote_file.meta_set({'starred': True})
+        assert remote_file.meta_get("starred") == {'starred': True}
+        assert len(requested) == 2
+
     def test_get_nonexistent_metadata(self, remote_tmpfile: DriveFile):
         remote_file = remote_tmpfile(size_bytes=700)
         with pytest.raises(HttpError):
@@ -764,3 +1275,27 @@ class TestMetadata:
     def test_size(self, remote_tmpfile: DriveFile):
         remote_file = remote_tmpfile(size_bytes=700)
         assert remote_file.size == 700
+
+    def test_metadata_from_listing(self, remote_tmpdir: DriveFolder, tmpfile: Path, monkeypatch):
+        local_file = tmpfile(size_bytes=700)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        remote_file.upload(str(local_file))
+
+        listed_file = next(remote_tmpdir.children(name=local_file.name, metadata=True))
+        def no_request(fields):
+            raise AssertionError("Requested {}".format(fields))
+        monkeypatch.setattr(listed_file, "meta_get", no_request)
+        assert listed_file.size == 700
+        assert listed_file.md5sum == md5_file(local_file)
+        assert listed_file.modified_time.year >= 2020
+
+    def test_metadata_from_upload(self, remote_tmpdir: DriveFolder, tmpfile: Path, monkeypatch):
+        local_file = tmpfile(size_bytes=chunksize_min*2+1)
+        remote_file = remote_tmpdir.new_file(local_file.name)
+        remote_file.upload(str(local_file), chunksize=chunksize_min)
+
+        def no_request(fields):
+            raise AssertionError("Requested {}".format(fields))
+        monkeypatch.setattr(remote_file, "meta_get", no_request)
+        assert remote_file.size == chunksize_min*2+1
+        assert remote_file.md5sum == md5_file(local_file)